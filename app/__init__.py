@@ -1,37 +1,57 @@
 from flask import Flask
 from .extensions import ma, limiter, cache 
 from .models import db
-from .blueprints.customers import customers_bp
-from .blueprints.mechanics import mechanics_bp
-from .blueprints.service_tickets import service_tickets_bp
-from .blueprints.parts import parts_bp
-from .blueprints.part_descriptions import part_descriptions_bp
-from flask_swagger_ui import get_swaggerui_blueprint
+from .commands import register_commands
+from .utils.auth import token_cache
+from .utils.cache_invalidation import register_cache_invalidation
+from .utils.engine import configure_engine, register_sqlite_pragmas
+from .utils.reporting import register_report_queue
+from .utils.search import register_search_sync
 
 SWAGGER_URL = '/api/docs'
 API_URL = '/static/swagger.yaml'
 
-#creating swagger blueprint
-swagger_blueprint = get_swaggerui_blueprint(SWAGGER_URL,API_URL, config={'app_name': 'Mechanic Shop'})
-
 def create_app(config_name):
     # Initialize my flask app
     app = Flask(__name__)
     app.config.from_object(f'config.{config_name}')
 
     # Extensions
+    configure_engine(app)
     db.init_app(app)
+    register_sqlite_pragmas(app)
     ma.init_app(app)
     limiter.init_app(app)
     cache.init_app(app)
+    register_cache_invalidation()
+    register_report_queue()
+    register_search_sync()
+    token_cache.maxsize = app.config.get("TOKEN_CACHE_SIZE", 1024)
 
     # Register Blueprints
+    # Imported here rather than at module level: routes and their marshmallow auto-schemas (which introspect
+    # the models) are only loaded by create_app, not by everything that imports the package (migrations, CLI)
+    from .blueprints.customers import customers_bp
+    from .blueprints.mechanics import mechanics_bp
+    from .blueprints.service_tickets import service_tickets_bp
+    from .blueprints.parts import parts_bp
+    from .blueprints.part_descriptions import part_descriptions_bp
+    from .blueprints.metrics import metrics_bp
+    from .blueprints.reports import reports_bp
     app.register_blueprint(customers_bp, url_prefix='/customers')
     app.register_blueprint(mechanics_bp, url_prefix='/mechanics')
     app.register_blueprint(service_tickets_bp, url_prefix='/service_tickets')
     app.register_blueprint(parts_bp, url_prefix='/parts')
     app.register_blueprint(part_descriptions_bp, url_prefix='/part_descriptions')
-    app.register_blueprint(swagger_blueprint, url_prefix=SWAGGER_URL)
+    app.register_blueprint(metrics_bp, url_prefix='/metrics')
+    app.register_blueprint(reports_bp, url_prefix='/reports')
+    if app.config.get("SWAGGER_UI_ENABLED", True):
+        from flask_swagger_ui import get_swaggerui_blueprint
+        #creating swagger blueprint
+        swagger_blueprint = get_swaggerui_blueprint(SWAGGER_URL,API_URL, config={'app_name': 'Mechanic Shop'})
+        app.register_blueprint(swagger_blueprint, url_prefix=SWAGGER_URL)
 
+    # CLI commands
+    register_commands(app)
 
     return app
\ No newline at end of file
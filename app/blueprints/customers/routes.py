@@ -1,13 +1,21 @@
 from app.blueprints.customers import customers_bp
-from app.models import Customers, db, Service_tickets
+from app.models import Customers, db, Service_tickets, Parts, ticket_mechanics
 from .schemas import customer_schema, customers_schema, customer_login_schema
 from flask import request, jsonify
 from marshmallow import ValidationError
 from app.blueprints.service_tickets.schemas import service_tickets_schema
-from werkzeug.security import generate_password_hash, check_password_hash
-from app.utils.auth import encode_token, token_required
-from app.extensions import limiter, cache
-from sqlalchemy import select
+from app.utils.passwords import hash_password, verify_and_update, PasswordVerificationBusy
+from app.utils.auth import encode_token, token_required, token_cache, current_principal
+from app.extensions import limiter
+from app.utils.caching import cached_view
+from app.utils.pagination import paginate
+from app.utils.search import search
+from app.utils.projection import project
+from app.utils.totals import customer_totals
+from sqlalchemy import select, delete, update
+from sqlalchemy.orm import selectinload
+from app.utils.ranking import adjust_ticket_counts, ticket_mechanic_ids
+from app.utils.reporting import queue_ticket_days
 
 #LOGIN ROUTE
 @customers_bp.route('/login', methods=['POST'])
@@ -18,7 +26,13 @@ def login():
     except ValidationError as e:
         return jsonify({"error message" : e.messages}), 400
     customer = db.session.query(Customers).where(Customers.email == credential_data["email"]).first()
-    if customer and check_password_hash(customer.password, credential_data["password"]):
+    try:
+        valid_credentials = customer is not None and verify_and_update(customer, credential_data["password"])
+    except PasswordVerificationBusy:
+        return jsonify({"error message" : "Too many logins in progress, please try again."}), 503
+    if valid_credentials:
+        # Persists the new hash when verify_and_update upgraded it
+        db.session.commit()
         customer_token = encode_token(customer.id, role="customer")
         response = {
             "message" : f"Successfully logged in. Welcome {customer.first_name}",
@@ -39,102 +53,94 @@ def create_customer():
     exist_customer = db.session.query(Customers).where(Customers.email == data["email"]).first()
     if exist_customer:
         return jsonify({"error" : f"{data["email"]} is already associated with an account."}), 400
-    data["password"] = generate_password_hash(data["password"])
+    data["password"] = hash_password(data["password"])
     new_customer = Customers(**data)
     db.session.add(new_customer)
     db.session.commit()
     new_customer_token = encode_token(new_customer.id, role="customer")
-    response = {"customer_data" : data,
+    response = {"customer_data" : customer_schema.dump(new_customer),
                 "token" : new_customer_token}
     return jsonify(response), 201
 
 @customers_bp.route('', methods=["GET"])
 @limiter.limit("300 per day", override_defaults=True) 
-# @cache.cached(timeout=10)
+@cached_view("customers")
 def read_customers():
-    try:
-        page = request.args.get('page',type=int)
-        per_page = request.args.get('per_page',type=int)
-        query = select(Customers)
-        customers = db.paginate(query,page=page, per_page=per_page) #Handles our pagination so we don't have to be worry about pagination with hard code
-        return customers_schema.jsonify(customers), 200
-    except:
-        customers = db.session.query(Customers).all()
-        return customers_schema.jsonify(customers), 200
+    return paginate(select(Customers), Customers, customers_schema)
 
 @customers_bp.route('/profile', methods=["GET"])
-@token_required
+@token_required(role="customer", load=True)
 def read_customer():
-    user_role = request.user_role
-    if user_role == "customer":
-        customer_id = request.user_id
-        customer = db.session.get(Customers, customer_id)
-        if not customer:
-            return jsonify({"error" : f"Customer with id: {customer_id} not found."}), 404
-        return customer_schema.jsonify(customer), 200
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}),400
+    return customer_schema.jsonify(current_principal()), 200
 
 @customers_bp.route('', methods=["DELETE"])
-@token_required
+@token_required(role="customer", load=True, columns=["id"])
 def delete_customer():
-    user_role = request.user_role
-    if user_role == "customer":
-        customer_id = request.user_id
-        customer = db.session.get(Customers, customer_id)
-        if not customer:
-            return jsonify({"error" : f"Customer with id: {customer_id} not found."}), 404
-        if len(customer.service_tickets)>0:
-            # Delete All service tickets for a specific user
-            db.session.query(Service_tickets).where(Service_tickets.customer_id == customer.id).delete()
-            db.session.commit()
-        db.session.delete(customer)
+    customer = current_principal()
+    customer_id = customer.id
+    service_ticket_ids = db.session.scalars(select(Service_tickets.id).where(Service_tickets.customer_id == customer_id)).all()
+    if len(service_ticket_ids)>0:
+        # Release the mechanics assigned to these service tickets and keep their ticket_count in sync
+        adjust_ticket_counts(ticket_mechanic_ids(service_ticket_ids), -1)
+        db.session.execute(delete(ticket_mechanics).where(ticket_mechanics.c.service_ticket_id.in_(service_ticket_ids)))
+        # Parts used in these service tickets go back to stock, like when a single service ticket is deleted
+        db.session.execute(update(Parts).where(Parts.ticket_id.in_(service_ticket_ids)).values(ticket_id=None))
+        queue_ticket_days(Service_tickets.customer_id == customer_id)
+        # Delete All service tickets for a specific user
+        db.session.query(Service_tickets).where(Service_tickets.customer_id == customer_id).delete()
         db.session.commit()
-        return jsonify({"message" : f"Successfully deleted customer with id: {customer_id}"}), 200
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}), 400
+    db.session.delete(customer)
+    db.session.commit()
+    token_cache.invalidate_subject(customer_id, "customer")
+    return jsonify({"message" : f"Successfully deleted customer with id: {customer_id}"}), 200
     
 @customers_bp.route('', methods=["PUT"])
-@token_required
+@token_required(role="customer", load=True)
 def update_customer():
-    user_role = request.user_role
-    if user_role == "customer":
-        customer_id = request.user_id
-        customer = db.session.get(Customers, customer_id)
-        if not customer:
-            return jsonify({"error" : f"Customer with id: {customer_id} not found."}), 404
-        try:
-            customer_data = customer_schema.load(request.json)
-        except ValidationError as e:
-            return jsonify({"error message" : e.messages}), 400
-        # Check the email customer wants to update not be taken with another customer
-        existing_email = db.session.query(Customers).where(Customers.email == customer_data["email"], Customers.id != customer_id).first()
-        if existing_email:
-            return jsonify({"error" : f"{customer_data["email"]} is already taken with another customer."}), 400
-        customer_data["password"] = generate_password_hash(customer_data["password"])
-        for key, value in customer_data.items():
-            setattr(customer, key, value)
-        db.session.commit()
-        return jsonify({"message" : f"Successfully customer with id: {customer_id} updated."}), 200
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}), 400
+    customer = current_principal()
+    customer_id = customer.id
+    try:
+        customer_data = customer_schema.load(request.json, partial=("password",))
+    except ValidationError as e:
+        return jsonify({"error message" : e.messages}), 400
+    # Check the email customer wants to update not be taken with another customer
+    existing_email = db.session.query(Customers).where(Customers.email == customer_data["email"], Customers.id != customer_id).first()
+    if existing_email:
+        return jsonify({"error" : f"{customer_data["email"]} is already taken with another customer."}), 400
+    # Only hash a password that was sent, leaving it out keeps the stored hash
+    if "password" in customer_data:
+        customer_data["password"] = hash_password(customer_data["password"])
+    for key, value in customer_data.items():
+        setattr(customer, key, value)
+    db.session.commit()
+    return jsonify({"message" : f"Successfully customer with id: {customer_id} updated."}), 200
     
 @customers_bp.route('/service_tickets', methods=["GET"])
-@token_required
+@token_required(role="customer", load=True, columns=["id"], options=[selectinload(Customers.service_tickets)])
 def read_customer_service_tickets():
-    user_role = request.user_role
-    if user_role == "customer":
-        customer_id = request.user_id
-        customer = db.session.get(Customers, customer_id)
-        if not customer:
-            return jsonify({"error" : f"Customer with id: {customer_id} not found."}), 404
-        return service_tickets_schema.jsonify(customer.service_tickets), 200
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}), 400
+    return service_tickets_schema.jsonify(current_principal().service_tickets), 200
+
+
+@customers_bp.route('/<int:customer_id>/total', methods=["GET"])
+@cached_view("customers", "service_tickets", "parts", "part_descriptions")
+def read_customer_total(customer_id):
+    if db.session.scalar(select(Customers.id).where(Customers.id == customer_id)) is None:
+        return jsonify({"error" : f"Customer with id: {customer_id} not found."}), 404
+    return jsonify(customer_totals(customer_id)), 200
 
 
 @customers_bp.route('/search_by_email', methods=["GET"])
 def search_by_email():
     email = request.args.get('email')
-    customers = db.session.query(Customers).where(Customers.email.ilike(f"%{email}%")).all()
-    return customers_schema.jsonify(customers), 200
\ No newline at end of file
+    if not email:
+        return jsonify({"error" : "You have to send the email that you want to search."}), 400
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if (limit is not None and limit <= 0) or offset < 0:
+        return jsonify({"error" : "limit has to be positive and offset can not be negative"}), 400
+    try:
+        schema, loader = project(Customers, customers_schema)
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    customers = search("customers", email, limit=limit, offset=offset, options=[loader])
+    return schema.jsonify(customers), 200
\ No newline at end of file
@@ -1,11 +1,15 @@
 from app.models import Customers
 from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 
 
-class CustomerSchema(ma.SQLAlchemyAutoSchema):
+class CustomerSchema(CompiledSchema):
     class Meta:
         model = Customers
 
+    # Accepted on create / update / login, never sent back
+    password = ma.auto_field(load_only=True)
+
 customer_schema = CustomerSchema()
 customers_schema = CustomerSchema(many=True)
 customer_login_schema = CustomerSchema(exclude=['first_name','last_name', 'phone', 'address'])
\ No newline at end of file
@@ -1,12 +1,19 @@
 from app.blueprints.mechanics import mechanics_bp
-from app.models import Mechanics, db
+from app.models import Mechanics, db, ticket_mechanics
 from .schemas import mechanic_schema, mechanics_schema, mechanic_login_schema
 from flask import request, jsonify
 from marshmallow import ValidationError
 from app.blueprints.service_tickets.schemas import service_tickets_schema
-from werkzeug.security import generate_password_hash, check_password_hash
-from app.utils.auth import encode_token, token_required
-from app.extensions import limiter, cache
+from app.utils.passwords import hash_password, verify_and_update, PasswordVerificationBusy
+from app.utils.auth import encode_token, token_required, token_cache, current_principal
+from app.extensions import limiter
+from app.utils.caching import cached_view
+from app.utils.ranking import rank_mechanics_by_work
+from app.utils.streaming import wants_stream, stream_query
+from app.utils.projection import project
+from app.utils.reporting import queue_service_tickets
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 
 #LOGIN ROUTE
 @mechanics_bp.route('/login', methods=['POST'])
@@ -17,7 +24,13 @@ def login():
     except ValidationError as e:
         return jsonify({"error message" : e.messages}), 400
     mechanic = db.session.query(Mechanics).where(Mechanics.email == credential_data["email"]).first()
-    if mechanic and check_password_hash(mechanic.password, credential_data["password"]):
+    try:
+        valid_credentials = mechanic is not None and verify_and_update(mechanic, credential_data["password"])
+    except PasswordVerificationBusy:
+        return jsonify({"error message" : "Too many logins in progress, please try again."}), 503
+    if valid_credentials:
+        # Persists the new hash when verify_and_update upgraded it
+        db.session.commit()
         customer_token = encode_token(mechanic.id, "mechanic")
         response = {
             "message" : f"Successfully logged in. Welcome {mechanic.first_name}",
@@ -38,7 +51,7 @@ def create_mechanic():
     exist_mechanic = db.session.query(Mechanics).where(Mechanics.email == data["email"]).first()
     if exist_mechanic:
         return jsonify({"error" : f"{data["email"]} is already associated with a mechanic's account."}), 400
-    data["password"] = generate_password_hash(data["password"])
+    data["password"] = hash_password(data["password"])
     new_mechanic = Mechanics(**data)
     db.session.add(new_mechanic)
     db.session.commit()
@@ -49,99 +62,90 @@ def create_mechanic():
 
 @mechanics_bp.route('', methods=["GET"])
 @limiter.limit("20 per minute", override_defaults=True)
-@cache.cached(timeout=10)
+@cached_view("mechanics", unless=wants_stream)
 def read_mechanics():
-    mechanics = db.session.query(Mechanics).all()
-    return mechanics_schema.jsonify(mechanics), 200
+    try:
+        schema, loader = project(Mechanics, mechanic_schema if wants_stream() else mechanics_schema)
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    query = select(Mechanics).options(loader).order_by(Mechanics.id)
+    if wants_stream():
+        return stream_query(query, schema.dump)
+    mechanics = db.session.scalars(query).all()
+    return schema.jsonify(mechanics), 200
 
 @mechanics_bp.route('/profile', methods=["GET"])
-@token_required
+@token_required(role="mechanic", load=True)
 def read_mechanic():
-    user_role = request.user_role
-    if user_role == "mechanic":
-        mechanic_id = request.user_id
-        mechanic = db.session.get(Mechanics, mechanic_id)
-        if not mechanic:
-            return jsonify({"error" : f"Mechanic with id: {mechanic_id} not found."}), 404
-        return mechanic_schema.jsonify(mechanic), 200
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}), 400
+    return mechanic_schema.jsonify(current_principal()), 200
 
 @mechanics_bp.route('', methods=["DELETE"])
-@token_required
+@token_required(role="mechanic", load=True, columns=["id"])
 def delete_mechanic():
-    user_role = request.user_role
-    if user_role == "mechanic":
-        mechanic_id = request.user_id
-        mechanic = db.session.get(Mechanics, mechanic_id)
-        if not mechanic:
-            return jsonify({"error" : f"Mechanic with id: {mechanic_id} not found."}), 404
-        db.session.delete(mechanic)
-        db.session.commit()
-        return jsonify({"message" : f"Successfully deleted mechanic with id: {mechanic_id}"}), 200
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}), 400
+    mechanic = current_principal()
+    mechanic_id = mechanic.id
+    # The labor of the mechanic's service_tickets is now shared by fewer mechanics in the reports
+    queue_service_tickets(db.session.scalars(select(ticket_mechanics.c.service_ticket_id).where(ticket_mechanics.c.mechanic_id == mechanic_id)))
+    db.session.delete(mechanic)
+    db.session.commit()
+    token_cache.invalidate_subject(mechanic_id, "mechanic")
+    return jsonify({"message" : f"Successfully deleted mechanic with id: {mechanic_id}"}), 200
     
 
 @mechanics_bp.route('', methods=["PUT"])
-@token_required
+@token_required(role="mechanic", load=True)
 def update_mechanic():
-    user_role = request.user_role
-    if user_role == "mechanic":
-        mechanic_id = request.user_id
-        mechanic = db.session.get(Mechanics, mechanic_id)
-        if not mechanic:
-            return jsonify({"error" : f"Mechanic with id: {mechanic_id} not found."}), 404
-        try:
-            mechanic_data = mechanic_schema.load(request.json)
-        except ValidationError as e:
-            return jsonify({"error message" : e.messages}), 400
-        # Check the email Mechanic wants to update not be taken with another mechanic
-        existing_email = db.session.query(Mechanics).where(Mechanics.email == mechanic_data["email"], Mechanics.id != mechanic_id).first()
-        if existing_email:
-            return jsonify({"error" : f"{mechanic_data["email"]} is already taken with another mechanic."}), 400
-        mechanic_data["password"] = generate_password_hash(mechanic_data["password"])
-        for key, value in mechanic_data.items():
-            setattr(mechanic, key, value)
-        db.session.commit()
-        return jsonify({"message" : f"Successfully mechanic with id: {mechanic_id} updated."}), 200
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}), 400
+    mechanic = current_principal()
+    mechanic_id = mechanic.id
+    try:
+        mechanic_data = mechanic_schema.load(request.json, partial=("password",))
+    except ValidationError as e:
+        return jsonify({"error message" : e.messages}), 400
+    # Check the email Mechanic wants to update not be taken with another mechanic
+    existing_email = db.session.query(Mechanics).where(Mechanics.email == mechanic_data["email"], Mechanics.id != mechanic_id).first()
+    if existing_email:
+        return jsonify({"error" : f"{mechanic_data["email"]} is already taken with another mechanic."}), 400
+    # Only hash a password that was sent, leaving it out keeps the stored hash
+    if "password" in mechanic_data:
+        mechanic_data["password"] = hash_password(mechanic_data["password"])
+    for key, value in mechanic_data.items():
+        setattr(mechanic, key, value)
+    db.session.commit()
+    return jsonify({"message" : f"Successfully mechanic with id: {mechanic_id} updated."}), 200
     
 @mechanics_bp.route('/service_tickets',methods=["GET"])
-@token_required
+@token_required(role="mechanic", load=True, columns=["id"], options=[selectinload(Mechanics.tickets)])
 def read_mechanic_service_tickets():
-    user_role = request.user_role
-    if user_role == "mechanic":
-        mechanic_id = request.user_id
-        mechanic = db.session.get(Mechanics,mechanic_id)
-        if not mechanic:
-            return jsonify({"error" : f"Mechanic with id: {mechanic_id} not found."}), 404
-        return service_tickets_schema.jsonify(mechanic.tickets), 200
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}), 400
+    return service_tickets_schema.jsonify(current_principal().tickets), 200
     
 
 @mechanics_bp.route('/hard_work_mechanic', methods=["GET"])
 def get_hard_work_mechanic():
-    mechanics = db.session.query(Mechanics).all()
-    mechanics.sort(key = lambda mechanic : len(mechanic.tickets), reverse=True)
-    hard_work_mechanic = mechanics[0]
+    ranking = rank_mechanics_by_work(limit=1)
+    if not ranking:
+        return jsonify({"message" : "There is no mechanic to show."}), 404
+    hard_work_mechanic, tickets_count = ranking[0]
     response = {
         "mechanic" : mechanic_schema.dump(hard_work_mechanic),
-        "tickets_count" : len(hard_work_mechanic.tickets)
+        "tickets_count" : tickets_count
     }
     return jsonify(response), 200
 
 @mechanics_bp.route('/sort_by_work', methods=["GET"])
 def get_sorted_mechanic_list_by_work():
-    mechanics = db.session.query(Mechanics).all()
-    mechanics.sort(key = lambda mechanic : len(mechanic.tickets), reverse=True)
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if (limit is not None and limit < 0) or offset < 0:
+        return jsonify({"error" : "limit and offset can not be negative"}), 400
+    try:
+        schema, loader = project(Mechanics, mechanic_schema)
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
     sorted_mechanics_list = []
-    for mechanic in mechanics:
+    for mechanic, tickets_count in rank_mechanics_by_work(limit=limit, offset=offset, options=[loader]):
         mechanic_result_format = {
-            "mechanic" : mechanic_schema.dump(mechanic),
-            "tickets_count" : len(mechanic.tickets)
+            "mechanic" : schema.dump(mechanic),
+            "tickets_count" : tickets_count
         }
         sorted_mechanics_list.append(mechanic_result_format)
     return jsonify(sorted_mechanics_list), 200
@@ -1,11 +1,16 @@
 from app.models import Mechanics
 from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 
 
-class MechanicSchema(ma.SQLAlchemyAutoSchema):
+class MechanicSchema(CompiledSchema):
     class Meta:
         model = Mechanics
 
+    # Accepted on create / update / login, never sent back
+    password = ma.auto_field(load_only=True)
+    ticket_count = ma.auto_field(dump_only=True)
+
 mechanic_schema = MechanicSchema()
 mechanics_schema = MechanicSchema(many=True)
 mechanic_login_schema = MechanicSchema(exclude=["first_name", "last_name", "phone", "address", "salary"])
\ No newline at end of file
@@ -0,0 +1,12 @@
+from app.blueprints.metrics import metrics_bp
+from flask import jsonify
+from app.models import db
+from app.utils.auth import token_required, token_cache
+from app.utils.engine import pool_stats
+
+# Numbers are per gunicorn worker (see "pid"), every worker has its own pool and token cache
+@metrics_bp.route('', methods=["GET"])
+@token_required(role="mechanic")
+def read_metrics():
+    return jsonify({"db_pool" : pool_stats(db.engine),
+                    "token_cache" : token_cache.stats()}), 200
@@ -3,6 +3,11 @@ from .schemas import part_description_schema, part_descriptions_schema
 from flask import request, jsonify
 from marshmallow import ValidationError
 from app.models import db, PartDescriptions
+from app.utils.streaming import wants_stream, stream_query
+from app.utils.search import search
+from app.utils.caching import cached_view
+from app.utils.projection import project
+from sqlalchemy import select
 
 
 @part_descriptions_bp.route('', methods=['POST'])
@@ -22,21 +27,38 @@ def create_part_description():
 
 
 @part_descriptions_bp.route('', methods=['GET'])
+@cached_view("part_descriptions", unless=wants_stream)
 def get_all_part_descriptions():
-    part_descriptions = db.session.query(PartDescriptions).all()
+    try:
+        schema, loader = project(PartDescriptions, part_description_schema if wants_stream() else part_descriptions_schema)
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    query = select(PartDescriptions).options(loader).order_by(PartDescriptions.id)
+    if wants_stream():
+        return stream_query(query, schema.dump)
+    part_descriptions = db.session.scalars(query).all()
     if len(part_descriptions)==0:
         return jsonify({"message" : "There is no part description to show."}), 200
-    return part_descriptions_schema.jsonify(part_descriptions), 200
+    return schema.jsonify(part_descriptions), 200
 
 @part_descriptions_bp.route('/search_by_name', methods=['GET'])
+@cached_view("part_descriptions")
 def get_all_descriptions_by_name():
     name = request.args.get("name")
     if name is None:
         return jsonify({"message" : "You have to send the name of part that you want to search."}), 200
-    part_descriptions = db.session.query(PartDescriptions).where(PartDescriptions.name.ilike(f"%{name}%")).all()
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if (limit is not None and limit <= 0) or offset < 0:
+        return jsonify({"error" : "limit has to be positive and offset can not be negative"}), 400
+    try:
+        schema, loader = project(PartDescriptions, part_descriptions_schema)
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    part_descriptions = search("part_descriptions", name, limit=limit, offset=offset, options=[loader])
     if len(part_descriptions)==0:
         return jsonify({"message" : "There is no part description to show."}), 200
-    return part_descriptions_schema.jsonify(part_descriptions), 200
+    return schema.jsonify(part_descriptions), 200
 
 @part_descriptions_bp.route('/<int:part_description_id>',methods=['PUT'])
 def update_part_description(part_description_id):
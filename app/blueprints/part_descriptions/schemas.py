@@ -1,10 +1,13 @@
 from app.models import Parts, PartDescriptions
 from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 
 
-class PartDescriptionSchema(ma.SQLAlchemyAutoSchema):
+class PartDescriptionSchema(CompiledSchema):
     class Meta:
         model = PartDescriptions
 
+    updated_at = ma.auto_field(dump_only=True)
+
 part_description_schema = PartDescriptionSchema()
 part_descriptions_schema = PartDescriptionSchema(many=True)
\ No newline at end of file
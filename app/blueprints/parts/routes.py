@@ -1,8 +1,13 @@
 from . import parts_bp
 from .schemas import part_schema, parts_schema
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from marshmallow import ValidationError
 from app.models import db, Parts
+from sqlalchemy import select, insert, or_
+from sqlalchemy.orm import joinedload
+from app.utils.streaming import wants_stream, stream_query
+from app.utils.pagination import DEFAULT_PAGE_SIZE
+from app.utils.reporting import queue_service_tickets
 
 
 
@@ -15,41 +20,63 @@ def create_part():
     quantity = request.args.get('qty', 1, type=int)
     if quantity <= 0:
         return jsonify({"error": "qty can not be 0 or negative"}), 400
-    count = 0
-    base_serial = data["serial_number"]
+    serial_numbers = next_free_serial_numbers(data["serial_number"], quantity)
+    # Insert every part in one batched INSERT and get the new ids back
+    new_parts = [{**data, "serial_number" : serial_number} for serial_number in serial_numbers]
+    part_ids = db.session.scalars(insert(Parts).returning(Parts.id), new_parts).all()
+    queue_service_tickets([data.get("ticket_id")])
+    db.session.commit()
+    return jsonify({"message": f"Successfully created {quantity} part(s) with description id: {data["desc_id"]}.",
+                    "part_ids" : part_ids}), 200
+
+
+def next_free_serial_numbers(base_serial, quantity):
+    # Fetch every serial number built from base_serial with one query, then pick the free ones in memory:
+    # base_serial itself first, then base_serial-1, base_serial-2, ... skipping the ones already taken
+    taken_serials = set(db.session.scalars(
+        select(Parts.serial_number).where(or_(Parts.serial_number == base_serial,
+                                              Parts.serial_number.startswith(base_serial + "-", autoescape=True)))
+    ))
+    serial_numbers = []
     new_serial = base_serial
-    serial = 1 
-    while count < quantity:
-        while check_existing_serial_number(new_serial):
+    serial = 1
+    while len(serial_numbers) < quantity:
+        while new_serial in taken_serials:
             new_serial = base_serial + "-" + str(serial)
             serial += 1
-        data['serial_number'] = new_serial
-        new_part = Parts(**data)
-        db.session.add(new_part)
-        count += 1
-    db.session.commit()
-    return jsonify({"message": f"Successfully created {quantity} part(s) with description id: {data["desc_id"]}."}), 200
-
-
-def check_existing_serial_number(serial_number):
-    existing_part = db.session.query(Parts).where(Parts.serial_number==serial_number).first()
-    if existing_part:
-        return True
-    return False
+        serial_numbers.append(new_serial)
+        taken_serials.add(new_serial)
+    return serial_numbers
 
 @parts_bp.route('', methods=['GET'])
 def get_all_parts():
-    parts = db.session.query(Parts).all()
-    response = []
-    for part in parts:
-        response_format = {
-            "part": part_schema.dump(part),
-            "part_name" : part.part_description.name,
-            "part_price" : part.part_description.price
-        }
-        response.append(response_format)
+    # Part descriptions are joined in the same SELECT instead of being lazy loaded per part
+    query = select(Parts).options(joinedload(Parts.part_description, innerjoin=True)).order_by(Parts.id)
+    desc_id = request.args.get('desc_id', type=int)
+    if desc_id is not None:
+        query = query.where(Parts.desc_id == desc_id)
+    ticket_id = request.args.get('ticket_id', type=int)
+    if ticket_id is not None:
+        query = query.where(Parts.ticket_id == ticket_id)
+    if wants_stream():
+        return stream_query(query, lambda part: part_response_format(part, part_schema.dump(part)))
+    # Always paged like the other listings, ?stream=true is the way to read every part
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    parts = db.paginate(query, page=page, per_page=per_page, max_per_page=current_app.config.get("MAX_PAGE_SIZE", 100),
+                        error_out=False, count=False).items
+    # Serialize all parts in one batched dump
+    response = [part_response_format(part, part_data) for part, part_data in zip(parts, parts_schema.dump(parts))]
     return jsonify(response), 200
 
+
+def part_response_format(part, part_data):
+    return {
+        "part" : part_data,
+        "part_name" : part.part_description.name,
+        "part_price" : part.part_description.price
+    }
+
 @parts_bp.route('/<int:part_id>', methods=['GET'])
 def get_specific_part(part_id):
     part = db.session.get(Parts,part_id)
@@ -71,6 +98,8 @@ def update_part(part_id):
     if exist_serial_number:
         return jsonify({"message" : f"This serial number: {part_data["serial_number"]} belongs to another product, you can not choose it,"}), 400
     
+    # The service_ticket it leaves and the one it joins both change in the reports
+    queue_service_tickets([part_to_update.ticket_id, part_data.get("ticket_id")])
     for key, value in part_data.items():
         setattr(part_to_update, key, value)
     db.session.commit()
@@ -81,6 +110,7 @@ def delete_part(part_id):
     part_to_delete = db.session.get(Parts,part_id)
     if not part_to_delete:
         return jsonify({"message" : f"Part with id: {part_id} not found"}), 404
+    queue_service_tickets([part_to_delete.ticket_id])
     db.session.delete(part_to_delete)
     db.session.commit()
     return jsonify({"message" : f"Successfully deleted part with id: {part_id}"}), 200
@@ -1,8 +1,8 @@
 from app.models import Parts, PartDescriptions
-from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 
 
-class PartSchema(ma.SQLAlchemyAutoSchema):
+class PartSchema(CompiledSchema):
     class Meta:
         model = Parts
         include_fk = True
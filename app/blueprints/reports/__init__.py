@@ -0,0 +1,6 @@
+from flask import Blueprint
+
+reports_bp = Blueprint('reports_bp', __name__)
+
+# It has to be here after creating blueprint
+from . import routes
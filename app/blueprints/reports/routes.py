@@ -0,0 +1,141 @@
+from datetime import date
+from app.blueprints.reports import reports_bp
+from flask import request, jsonify
+from sqlalchemy import select, func
+from app.models import db, Mechanics, Customers, report_daily, report_mechanic_daily, report_customer_daily, report_parts_daily
+from app.utils.auth import token_required
+from app.utils.caching import cached_view
+from app.utils.reporting import last_refresh
+
+DEFAULT_LIMIT = 10
+
+# Every report reads the daily rollups (see app/utils/reporting.py), never the live tables.
+# They are as fresh as the last `flask refresh-reports`, which invalidates the "reports" cache tag.
+
+
+def report_period():
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD, both optional and inclusive
+    try:
+        start = date.fromisoformat(request.args["start"]) if request.args.get("start") else None
+        end = date.fromisoformat(request.args["end"]) if request.args.get("end") else None
+    except ValueError:
+        raise ValueError("start and end have to be dates like 2024-01-31")
+    if start and end and start > end:
+        raise ValueError("start can not be after end")
+    return start, end
+
+
+def in_period(table, start, end):
+    conditions = []
+    if start:
+        conditions.append(table.c.day >= start)
+    if end:
+        conditions.append(table.c.day <= end)
+    return conditions
+
+
+def report_limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    if limit <= 0:
+        raise ValueError("limit has to be positive")
+    return limit
+
+
+def report_response(items, start, end):
+    refreshed_at = last_refresh()
+    response = {
+        "start" : start.isoformat() if start else None,
+        "end" : end.isoformat() if end else None,
+        "refreshed_at" : refreshed_at.isoformat() if refreshed_at else None,
+        "items" : items
+    }
+    return jsonify(response), 200
+
+
+@reports_bp.route('/daily', methods=["GET"])
+@token_required(role="mechanic")
+@cached_view("reports")
+def read_daily_report():
+    try:
+        start, end = report_period()
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    query = select(report_daily).where(*in_period(report_daily, start, end)).order_by(report_daily.c.day)
+    items = [
+        {"day" : day.isoformat(), "tickets" : tickets, "labor" : round(labor, 2), "parts" : round(parts, 2), "total" : round(labor + parts, 2)}
+        for day, tickets, labor, parts in db.session.execute(query)
+    ]
+    return report_response(items, start, end)
+
+
+@reports_bp.route('/mechanic_revenue', methods=["GET"])
+@token_required(role="mechanic")
+@cached_view("reports")
+def read_mechanic_revenue_report():
+    try:
+        start, end = report_period()
+        limit = report_limit()
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    revenue = func.sum(report_mechanic_daily.c.revenue)
+    query = (
+        select(report_mechanic_daily.c.mechanic_id, Mechanics.first_name, Mechanics.last_name, func.sum(report_mechanic_daily.c.tickets), revenue)
+        .outerjoin(Mechanics, Mechanics.id == report_mechanic_daily.c.mechanic_id)
+        .where(*in_period(report_mechanic_daily, start, end))
+        .group_by(report_mechanic_daily.c.mechanic_id, Mechanics.first_name, Mechanics.last_name)
+        .order_by(revenue.desc(), report_mechanic_daily.c.mechanic_id)
+        .limit(limit)
+    )
+    items = [
+        {"mechanic_id" : mechanic_id, "first_name" : first_name, "last_name" : last_name, "tickets" : tickets, "revenue" : round(mechanic_revenue, 2)}
+        for mechanic_id, first_name, last_name, tickets, mechanic_revenue in db.session.execute(query)
+    ]
+    return report_response(items, start, end)
+
+
+@reports_bp.route('/parts_usage', methods=["GET"])
+@token_required(role="mechanic")
+@cached_view("reports")
+def read_parts_usage_report():
+    try:
+        start, end = report_period()
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    parts = func.sum(report_parts_daily.c.parts)
+    query = (
+        select(report_parts_daily.c.made_in, parts, func.sum(report_parts_daily.c.revenue))
+        .where(*in_period(report_parts_daily, start, end))
+        .group_by(report_parts_daily.c.made_in)
+        .order_by(parts.desc(), report_parts_daily.c.made_in)
+    )
+    items = [
+        {"made_in" : made_in, "parts" : parts_count, "revenue" : round(parts_revenue, 2)}
+        for made_in, parts_count, parts_revenue in db.session.execute(query)
+    ]
+    return report_response(items, start, end)
+
+
+@reports_bp.route('/top_customers', methods=["GET"])
+@token_required(role="mechanic")
+@cached_view("reports")
+def read_top_customers_report():
+    try:
+        start, end = report_period()
+        limit = report_limit()
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    tickets = func.sum(report_customer_daily.c.tickets)
+    revenue = func.sum(report_customer_daily.c.revenue)
+    query = (
+        select(report_customer_daily.c.customer_id, Customers.first_name, Customers.last_name, tickets, revenue)
+        .outerjoin(Customers, Customers.id == report_customer_daily.c.customer_id)
+        .where(*in_period(report_customer_daily, start, end))
+        .group_by(report_customer_daily.c.customer_id, Customers.first_name, Customers.last_name)
+        .order_by(tickets.desc(), revenue.desc(), report_customer_daily.c.customer_id)
+        .limit(limit)
+    )
+    items = [
+        {"customer_id" : customer_id, "first_name" : first_name, "last_name" : last_name, "tickets" : customer_tickets, "revenue" : round(customer_revenue, 2)}
+        for customer_id, first_name, last_name, customer_tickets, customer_revenue in db.session.execute(query)
+    ]
+    return report_response(items, start, end)
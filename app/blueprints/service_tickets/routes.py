@@ -1,61 +1,165 @@
-from .schemas import service_ticket_schema, service_tickets_schema
+from .schemas import service_ticket_schema, service_tickets_schema, mechanic_ids_schema, part_ids_schema, MAX_BULK_IDS
 from app.blueprints.service_tickets import service_tickets_bp
 from flask import request, jsonify
 from marshmallow import ValidationError
-from app.models import Service_tickets, db, Customers, Mechanics, Parts
+from app.models import Service_tickets, db, Customers, Mechanics, Parts, PartDescriptions
 from app.blueprints.mechanics.schemas import mechanics_schema
-from app.utils.auth import token_required
+from app.blueprints.customers.schemas import customer_schema
+from app.blueprints.parts.schemas import parts_schema
+from app.blueprints.part_descriptions.schemas import part_description_schema
+from app.utils.auth import token_required, current_principal
+from app.utils.pagination import paginate
+from app.utils.streaming import wants_stream, stream_query
 from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
 from app.extensions import limiter
+from app.utils.caching import cached_view
+from app.utils.ranking import adjust_ticket_counts, ticket_mechanic_ids
+from app.utils.projection import column_loader
+from app.utils.totals import ticket_totals
+from app.utils.assignments import assign_mechanics, unassign_mechanics, attach_parts, detach_parts
+from app.utils.reporting import queue_ticket_days
 
 @service_tickets_bp.route('', methods=["POST"])
 @limiter.limit("3 per hour")
-@token_required
+@token_required(role="customer", load=True, columns=["id"])
 def create_service_ticket():
-    user_role = request.user_role
-    if user_role == "customer":
-        customer_id = request.user_id
-        customer = db.session.get(Customers, customer_id)
-        if not customer:
-            return jsonify({"error" : f"Customer with id: {customer_id} not found."}), 404
-        try:
-            data = service_ticket_schema.load(request.json)
-        except ValidationError as e:
-            return jsonify({"error message" : e.messages}), 400
-        print(data)
-
-        new_service_ticket = Service_tickets(**data,customer=customer)
-        db.session.add(new_service_ticket)
-        customer.service_tickets.append(new_service_ticket)
-        db.session.commit()
-        return service_ticket_schema.jsonify(new_service_ticket), 201
-    else:
-        return jsonify({"message" : f"{user_role} is not allowed."}), 400
+    customer = current_principal()
+    try:
+        data = service_ticket_schema.load(request.json)
+    except ValidationError as e:
+        return jsonify({"error message" : e.messages}), 400
+
+    new_service_ticket = Service_tickets(**data,customer=customer)
+    db.session.add(new_service_ticket)
+    db.session.commit()
+    return service_ticket_schema.jsonify(new_service_ticket), 201
 
 @service_tickets_bp.route('', methods=["GET"])
+@cached_view("service_tickets", unless=wants_stream)
 def read_service_tickets():
+    if wants_stream():
+        return stream_query(select(Service_tickets).order_by(Service_tickets.id), service_ticket_schema.dump)
+    return paginate(select(Service_tickets), Service_tickets, service_tickets_schema)
+
+# Relations the ticket detail can embed with ?expand=, and the cache tag of the rows each one shows
+EXPANSION_TAGS = {
+    "customer" : "customers",
+    "mechanics" : "mechanics",
+    "parts" : "parts",
+    "parts.part_description" : "part_descriptions",
+}
+
+
+def requested_expansions():
+    raw = request.args.get("expand")
+    if raw is None:
+        return set()
+    expansions = {expansion.strip() for expansion in raw.split(",") if expansion.strip()}
+    unknown = expansions - EXPANSION_TAGS.keys()
+    if unknown:
+        raise ValueError(f"unknown expansion(s): {", ".join(sorted(unknown))}")
+    if "parts.part_description" in expansions:
+        expansions.add("parts")
+    return expansions
+
+
+def expansion_tags():
     try:
-        page = request.args.get('page',type=int)
-        per_page = request.args.get('per_page',type=int)
-        query = select(Service_tickets)
-        service_tickets = db.paginate(query,page=page, per_page=per_page) #Handles our pagination so we don't have to be worry about pagination with hard code
-        return service_tickets_schema.jsonify(service_tickets), 200
-    except:
-        service_tickets = db.session.query(Service_tickets).all()
-        return service_tickets_schema.jsonify(service_tickets), 200
+        return [EXPANSION_TAGS[expansion] for expansion in sorted(requested_expansions())]
+    except ValueError:
+        return []
+
+
+def expansion_options(expansions):
+    # One joined load for the customer and one SELECT ... IN per collection, however many rows they hold
+    options = []
+    if "customer" in expansions:
+        options.append(joinedload(Service_tickets.customer, innerjoin=True).options(column_loader(Customers, customer_schema)))
+    if "mechanics" in expansions:
+        options.append(selectinload(Service_tickets.mechanics).options(column_loader(Mechanics, mechanics_schema)))
+    if "parts" in expansions:
+        parts = selectinload(Service_tickets.parts)
+        if "parts.part_description" in expansions:
+            parts = parts.joinedload(Parts.part_description, innerjoin=True)
+        options.append(parts)
+    return options
+
+
+def service_ticket_response(service_ticket, expansions):
+    response = service_ticket_schema.dump(service_ticket)
+    if "customer" in expansions:
+        response["customer"] = customer_schema.dump(service_ticket.customer)
+    if "mechanics" in expansions:
+        response["mechanics"] = mechanics_schema.dump(service_ticket.mechanics)
+    if "parts" in expansions:
+        response["parts"] = parts_schema.dump(service_ticket.parts)
+        if "parts.part_description" in expansions:
+            for part, part_data in zip(service_ticket.parts, response["parts"]):
+                part_data["part_description"] = part_description_schema.dump(part.part_description)
+    return response
+
 
 @service_tickets_bp.route('/<int:service_ticket_id>', methods=["GET"])
+@cached_view("service_ticket:{service_ticket_id}", "service_tickets:*", expansion_tags)
 def read_service_ticket(service_ticket_id):
-    service_ticket = db.session.get(Service_tickets, service_ticket_id)
+    try:
+        expansions = requested_expansions()
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    service_ticket = db.session.get(Service_tickets, service_ticket_id, options=expansion_options(expansions))
     if not service_ticket:
         return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
-    return service_ticket_schema.jsonify(service_ticket), 200
+    return jsonify(service_ticket_response(service_ticket, expansions)), 200
+
+@service_tickets_bp.route('/<int:service_ticket_id>/total', methods=["GET"])
+@cached_view("service_ticket:{service_ticket_id}", "service_tickets:*", "part_descriptions")
+def read_service_ticket_total(service_ticket_id):
+    totals = ticket_totals([service_ticket_id])
+    if service_ticket_id not in totals:
+        return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
+    return jsonify(totals[service_ticket_id]), 200
+
+
+def requested_ticket_ids():
+    # ?ids=1,2,3 of the batch totals endpoint
+    try:
+        ids = list(dict.fromkeys(int(ticket_id) for ticket_id in request.args.get("ids", "").split(",") if ticket_id.strip()))
+    except ValueError:
+        raise ValueError("ids has to be a comma separated list of service_ticket ids")
+    if not ids or len(ids) > MAX_BULK_IDS:
+        raise ValueError(f"send between 1 and {MAX_BULK_IDS} service_ticket ids")
+    return ids
+
+
+def totals_tags():
+    try:
+        return [f"service_ticket:{ticket_id}" for ticket_id in requested_ticket_ids()]
+    except ValueError:
+        return []
+
+
+@service_tickets_bp.route('/totals', methods=["GET"])
+@cached_view(totals_tags, "service_tickets:*", "part_descriptions")
+def read_service_tickets_totals():
+    try:
+        service_ticket_ids = requested_ticket_ids()
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    totals = ticket_totals(service_ticket_ids)
+    response = {
+        "totals" : [totals[ticket_id] for ticket_id in service_ticket_ids if ticket_id in totals],
+        "missing" : [ticket_id for ticket_id in service_ticket_ids if ticket_id not in totals]
+    }
+    return jsonify(response), 200
 
 @service_tickets_bp.route('/<int:service_ticket_id>', methods=["DELETE"])
 def delete_service_ticket(service_ticket_id):
     service_ticket = db.session.get(Service_tickets, service_ticket_id)
     if not service_ticket:
         return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
+    adjust_ticket_counts(ticket_mechanic_ids([service_ticket_id]), -1)
+    queue_ticket_days(Service_tickets.id == service_ticket_id)
     db.session.delete(service_ticket)
     db.session.commit()
     return jsonify({"message" : f"Successfully deleted service_ticket with id: {service_ticket_id}"}), 200
@@ -75,6 +179,7 @@ def update_service_ticket(service_ticket_id):
     return jsonify({"message" : f"Successfully service_ticket with id: {service_ticket_id} updated."}), 200
 
 @service_tickets_bp.route('/mechanics/<int:service_ticket_id>', methods=["GET"])
+@cached_view("service_ticket:{service_ticket_id}", "service_tickets:*", "mechanics")
 def read_service_ticket_mechanics(service_ticket_id):
     service_ticket = db.session.get(Service_tickets, service_ticket_id)
     if not service_ticket:
@@ -82,70 +187,110 @@ def read_service_ticket_mechanics(service_ticket_id):
     return mechanics_schema.jsonify(service_ticket.mechanics)
     
 
+def service_ticket_exists(service_ticket_id):
+    return db.session.scalar(select(Service_tickets.id).where(Service_tickets.id == service_ticket_id)) is not None
+
+
+# The single assign / remove routes below check membership with one query on ticket_mechanics or parts
+# and change it with one statement, they never load the service_ticket's mechanics or parts collections
 @service_tickets_bp.route('/<int:service_ticket_id>/assign-mechanic/<int:mechanic_id>', methods=["PUT"])
 def add_mechanic_to_service_ticket(service_ticket_id,mechanic_id):
-    service_ticket = db.session.get(Service_tickets, service_ticket_id)
-    mechanic = db.session.get(Mechanics,mechanic_id)
-    if not service_ticket:
+    if not service_ticket_exists(service_ticket_id):
         return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
-    if not mechanic:
+    last_name = db.session.scalar(select(Mechanics.last_name).where(Mechanics.id == mechanic_id))
+    if last_name is None:
        return jsonify({"error" : f"Mechanic with id: {mechanic_id} not found."}), 404
-    if mechanic not in service_ticket.mechanics:
-        service_ticket.mechanics.append(mechanic)
-        mechanic.tickets.append(service_ticket)
+    if assign_mechanics(service_ticket_id, [mechanic_id]):
         db.session.commit()
         return jsonify({"message" : f"Successfully mechanic with id: {mechanic_id} added to service_ticket with id:{service_ticket_id}."}), 200
     else:
-        return jsonify({"message" : f"{mechanic.last_name} is already added in service_ticket with id:{service_ticket_id}."}),200
+        return jsonify({"message" : f"{last_name} is already added in service_ticket with id:{service_ticket_id}."}),200
 
 
 @service_tickets_bp.route('/<int:service_ticket_id>/remove-mechanic/<int:mechanic_id>', methods=["PUT"])
 def remove_mechanic_from_service_ticket(service_ticket_id,mechanic_id):
-    service_ticket = db.session.get(Service_tickets, service_ticket_id)
-    mechanic = db.session.get(Mechanics,mechanic_id)
-    if not service_ticket:
+    if not service_ticket_exists(service_ticket_id):
         return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
-    if not mechanic:
+    last_name = db.session.scalar(select(Mechanics.last_name).where(Mechanics.id == mechanic_id))
+    if last_name is None:
        return jsonify({"error" : f"Mechanic with id: {mechanic_id} not found."}), 404
-    if mechanic in service_ticket.mechanics:
-        service_ticket.mechanics.remove(mechanic)
+    if unassign_mechanics(service_ticket_id, [mechanic_id]):
         db.session.commit()
         return jsonify({"message" : f"Successfully mechanic with id: {mechanic_id} removed from service_ticket with id:{service_ticket_id}."}), 200
     else:
-        return jsonify({"message" : f"{mechanic.last_name} is not in service_ticket with id: {service_ticket.id}"}),200
+        return jsonify({"message" : f"{last_name} is not in service_ticket with id: {service_ticket_id}"}),200
 
 
 
 # Create a route to add part to service_ticket
 @service_tickets_bp.route('/<int:service_ticket_id>/add_part/<int:part_id>', methods=["PUT"])
 def add_part_to_service_ticket(service_ticket_id,part_id):
-    service_ticket = db.session.get(Service_tickets, service_ticket_id)
-    part = db.session.get(Parts, part_id)
-    if not service_ticket:
+    if not service_ticket_exists(service_ticket_id):
         return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
-    if not part:
+    part = db.session.execute(
+        select(Parts.ticket_id, PartDescriptions.name).join(Parts.part_description).where(Parts.id == part_id)
+    ).first()
+    if part is None:
        return jsonify({"error" : f"Part with id: {part_id} not found."}), 404
-    if part.ticket_id is not None and part.ticket_id != service_ticket_id:
+    if part.ticket_id == service_ticket_id:
+        return jsonify({"message" : f"{part.name} is already added in service_ticket with id:{service_ticket_id}."}),200
+    # Only a part in stock is attached, so a part taken by another service_ticket meanwhile is refused too
+    if part.ticket_id is not None or not attach_parts(service_ticket_id, [part_id]):
+        db.session.rollback()
         return jsonify({"error" : f"Part with id: {part_id} is already used in another service_ticket."}), 404
-    if part not in service_ticket.parts:
-        service_ticket.parts.append(part)
-        db.session.commit()
-        return jsonify({"message" : f"Successfully part with id: {part_id} added to service_ticket with id:{service_ticket_id}."}), 200
-    else:
-        return jsonify({"message" : f"{part.part_description.name} is already added in service_ticket with id:{service_ticket_id}."}),200
+    db.session.commit()
+    return jsonify({"message" : f"Successfully part with id: {part_id} added to service_ticket with id:{service_ticket_id}."}), 200
     
 
 @service_tickets_bp.route('/<int:service_ticket_id>/remove_part/<int:part_id>', methods=["PUT"])
 def remove_part_from_service_ticket(service_ticket_id,part_id):
-    service_ticket = db.session.get(Service_tickets, service_ticket_id)
-    part = db.session.get(Parts, part_id)
-    if not service_ticket:
+    if not service_ticket_exists(service_ticket_id):
         return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
-    if not part:
+    name = db.session.scalar(select(PartDescriptions.name).join(PartDescriptions.parts).where(Parts.id == part_id))
+    if name is None:
        return jsonify({"error" : f"Part with id: {part_id} not found."}), 404
-    if part in service_ticket.parts:
-        service_ticket.parts.remove(part)
+    if detach_parts(service_ticket_id, [part_id]):
         db.session.commit()
         return jsonify({"message" : f"Successfully part with id: {part_id} removed from service_ticket with id:{service_ticket_id}."}), 200
     else:
-        return jsonify({"message" : f"{part.part_description.name} is not in service_ticket with id:{service_ticket_id}."}),200
+        return jsonify({"message" : f"{name} is not in service_ticket with id:{service_ticket_id}."}),200
+
+
+@service_tickets_bp.route('/<int:service_ticket_id>/assign-mechanics', methods=["PUT"])
+def add_mechanics_to_service_ticket(service_ticket_id):
+    try:
+        mechanic_ids = list(dict.fromkeys(mechanic_ids_schema.load(request.json)["mechanic_ids"]))
+    except ValidationError as e:
+        return jsonify({"error message" : e.messages}), 400
+    if not service_ticket_exists(service_ticket_id):
+        return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
+    existing_ids = set(db.session.scalars(select(Mechanics.id).where(Mechanics.id.in_(mechanic_ids))))
+    assigned_ids = set(assign_mechanics(service_ticket_id, [mechanic_id for mechanic_id in mechanic_ids if mechanic_id in existing_ids]))
+    db.session.commit()
+    response = {
+        "added" : [mechanic_id for mechanic_id in mechanic_ids if mechanic_id in assigned_ids],
+        "skipped" : [mechanic_id for mechanic_id in mechanic_ids if mechanic_id in existing_ids and mechanic_id not in assigned_ids],
+        "missing" : [mechanic_id for mechanic_id in mechanic_ids if mechanic_id not in existing_ids]
+    }
+    return jsonify(response), 200
+
+
+@service_tickets_bp.route('/<int:service_ticket_id>/add_parts', methods=["PUT"])
+def add_parts_to_service_ticket(service_ticket_id):
+    try:
+        part_ids = list(dict.fromkeys(part_ids_schema.load(request.json)["part_ids"]))
+    except ValidationError as e:
+        return jsonify({"error message" : e.messages}), 400
+    if not service_ticket_exists(service_ticket_id):
+        return jsonify({"error" : f"Service_ticket with id: {service_ticket_id} not found."}), 404
+    ticket_ids = dict(db.session.execute(select(Parts.id, Parts.ticket_id).where(Parts.id.in_(part_ids))).all())
+    attached_ids = set(attach_parts(service_ticket_id, [part_id for part_id in part_ids if part_id in ticket_ids and ticket_ids[part_id] is None]))
+    db.session.commit()
+    # Parts already in this service_ticket are skipped, parts used in another one are reported apart
+    response = {
+        "added" : [part_id for part_id in part_ids if part_id in attached_ids],
+        "skipped" : [part_id for part_id in part_ids if ticket_ids.get(part_id) == service_ticket_id],
+        "unavailable" : [part_id for part_id in part_ids if part_id in ticket_ids and part_id not in attached_ids and ticket_ids[part_id] != service_ticket_id],
+        "missing" : [part_id for part_id in part_ids if part_id not in ticket_ids]
+    }
+    return jsonify(response), 200
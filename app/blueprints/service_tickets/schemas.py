@@ -1,9 +1,27 @@
+from marshmallow import fields, validate
 from app.models import Service_tickets
 from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 
-class Service_ticketSchema(ma.SQLAlchemyAutoSchema):
+class Service_ticketSchema(CompiledSchema):
     class Meta:
         model = Service_tickets
 
+    created_at = ma.auto_field(dump_only=True)
+    updated_at = ma.auto_field(dump_only=True)
+
 service_ticket_schema = Service_ticketSchema()
 service_tickets_schema = Service_ticketSchema(many=True)
+
+
+# Request bodies of the bulk assign-mechanics / add_parts endpoints
+MAX_BULK_IDS = 500
+
+class MechanicIdsSchema(ma.Schema):
+    mechanic_ids = fields.List(fields.Integer(strict=True), required=True, validate=validate.Length(min=1, max=MAX_BULK_IDS))
+
+class PartIdsSchema(ma.Schema):
+    part_ids = fields.List(fields.Integer(strict=True), required=True, validate=validate.Length(min=1, max=MAX_BULK_IDS))
+
+mechanic_ids_schema = MechanicIdsSchema()
+part_ids_schema = PartIdsSchema()
@@ -0,0 +1,51 @@
+import click
+from flask.cli import with_appcontext
+from app.models import db
+from app.migrations import upgrade, current_version
+from app.utils.cache_invalidation import invalidate_all
+from app.utils.ranking import rebuild_ticket_counts
+from app.utils.search import rebuild_search_index
+from app.utils.reporting import refresh_reports
+
+
+def register_commands(app):
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(rebuild_ticket_counts_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(refresh_reports_command)
+
+
+@click.command('db-upgrade', help="Apply the pending schema migrations from app/migrations.")
+@click.option('--target', type=int, default=None, help="Stop at this migration version.")
+@with_appcontext
+def db_upgrade_command(target):
+    applied = upgrade(db.engine, target)
+    for name in applied:
+        click.echo(f"Applied {name}.")
+    if applied:
+        invalidate_all()
+    with db.engine.connect() as connection:
+        click.echo(f"Database is at version {current_version(connection)}.")
+
+
+@click.command('rebuild-ticket-counts', help="Rebuild mechanics.ticket_count from the ticket_mechanics table.")
+@with_appcontext
+def rebuild_ticket_counts_command():
+    updated = rebuild_ticket_counts()
+    click.echo(f"Rebuilt ticket_count for {updated} mechanic(s).")
+
+
+@click.command('rebuild-search-index', help="Rebuild the search_trigrams index for customers and part descriptions.")
+@with_appcontext
+def rebuild_search_index_command():
+    indexed = rebuild_search_index()
+    click.echo(f"Indexed {indexed} row(s).")
+
+
+@click.command('refresh-reports', help="Refresh the reporting rollups from the service tickets changed since the last refresh.")
+@click.option('--full', is_flag=True, help="Rebuild every day instead of the days changed since the last refresh.")
+@with_appcontext
+def refresh_reports_command(full):
+    refreshed = refresh_reports(db.session, full=full)
+    db.session.commit()
+    click.echo(f"Refreshed {refreshed} day(s).")
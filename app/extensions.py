@@ -1,13 +1,14 @@
 from flask_marshmallow import Marshmallow
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_caching import Cache
+from app.utils.rate_limit import rate_limit_key
 
 ma = Marshmallow()
 
+# Storage and strategy come from RATELIMIT_STORAGE_URI / RATELIMIT_STRATEGY in the config
 limiter = Limiter(
-    key_func=get_remote_address,
+    key_func=rate_limit_key,
     default_limits=["500 per day", "100 per hour"]
 )
 
-cache = Cache()
\ No newline at end of file
+cache = Cache()
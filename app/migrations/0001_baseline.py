@@ -0,0 +1,68 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, ForeignKey
+
+# The tables the app started with, frozen here: later changes to app/models.py must not change this step
+metadata = MetaData()
+
+customers = Table(
+    "customers",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("first_name", String(250), nullable=False),
+    Column("last_name", String(250), nullable=False),
+    Column("email", String(350), nullable=False, unique=True),
+    Column("password", String(200), nullable=False),
+    Column("phone", String(50), nullable=False),
+    Column("address", String(500), nullable=True)
+)
+
+mechanics = Table(
+    "mechanics",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("first_name", String(250), nullable=False),
+    Column("last_name", String(250), nullable=False),
+    Column("email", String(350), nullable=False, unique=True),
+    Column("password", String(200), nullable=False),
+    Column("phone", String(50), nullable=False),
+    Column("address", String(500), nullable=True),
+    Column("salary", Float, nullable=False)
+)
+
+part_descriptions = Table(
+    "part_descriptions",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(225), nullable=False),
+    Column("price", Float, nullable=False),
+    Column("made_in", String(200), nullable=False)
+)
+
+service_tickets = Table(
+    "service_tickets",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("customer_id", Integer, ForeignKey("customers.id"), nullable=False),
+    Column("service_desc", String(400), nullable=True),
+    Column("price", Float, nullable=False),
+    Column("VIN", String(100), nullable=False)
+)
+
+parts = Table(
+    "parts",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("ticket_id", Integer, ForeignKey("service_tickets.id"), nullable=True),
+    Column("desc_id", Integer, ForeignKey("part_descriptions.id"), nullable=False),
+    Column("serial_number", String(50), nullable=False, unique=True)
+)
+
+ticket_mechanics = Table(
+    "ticket_mechanics",
+    metadata,
+    Column("service_ticket_id", Integer, ForeignKey("service_tickets.id"), nullable=False),
+    Column("mechanic_id", Integer, ForeignKey("mechanics.id"), nullable=False)
+)
+
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
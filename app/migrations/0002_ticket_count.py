@@ -0,0 +1,20 @@
+from sqlalchemy import MetaData, Table, Column, Integer, Index, inspect, text
+from app.migrations import create_missing_indexes
+
+metadata = MetaData()
+mechanics = Table("mechanics", metadata, Column("id", Integer, primary_key=True), Column("ticket_count", Integer))
+INDEXES = [Index("ix_mechanics_workload", mechanics.c.ticket_count.desc(), mechanics.c.id)]
+
+TICKET_COUNTS = text(
+    "UPDATE mechanics SET ticket_count = "
+    "(SELECT count(service_ticket_id) FROM ticket_mechanics WHERE ticket_mechanics.mechanic_id = mechanics.id)"
+)
+
+
+def upgrade(connection):
+    # mechanics.ticket_count, filled from the existing assignments, and the workload ranking index
+    columns = [column["name"] for column in inspect(connection).get_columns("mechanics")]
+    if "ticket_count" not in columns:
+        connection.execute(text("ALTER TABLE mechanics ADD COLUMN ticket_count INTEGER NOT NULL DEFAULT 0"))
+        connection.execute(TICKET_COUNTS)
+    create_missing_indexes(connection, INDEXES)
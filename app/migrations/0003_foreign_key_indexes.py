@@ -0,0 +1,51 @@
+from sqlalchemy import MetaData, Table, Column, Integer, ForeignKey, Index, inspect, text, select, func
+from app.migrations import create_missing_indexes
+
+metadata = MetaData()
+mechanics = Table("mechanics", metadata, Column("id", Integer, primary_key=True))
+service_tickets = Table("service_tickets", metadata, Column("id", Integer, primary_key=True), Column("customer_id", Integer))
+parts = Table("parts", metadata, Column("id", Integer, primary_key=True), Column("ticket_id", Integer), Column("desc_id", Integer))
+# ticket_mechanics with its composite primary key, the table is recreated from this definition
+ticket_mechanics = Table(
+    "ticket_mechanics",
+    metadata,
+    Column("service_ticket_id", Integer, ForeignKey("service_tickets.id"), primary_key=True),
+    Column("mechanic_id", Integer, ForeignKey("mechanics.id"), primary_key=True)
+)
+INDEXES = [
+    Index("ix_service_tickets_customer_id", service_tickets.c.customer_id),
+    Index("ix_parts_ticket_id", parts.c.ticket_id),
+    Index("ix_parts_desc_id", parts.c.desc_id),
+    Index("ix_ticket_mechanics_mechanic_id", ticket_mechanics.c.mechanic_id, ticket_mechanics.c.service_ticket_id),
+]
+
+TICKET_COUNTS = text(
+    "UPDATE mechanics SET ticket_count = "
+    "(SELECT count(service_ticket_id) FROM ticket_mechanics WHERE ticket_mechanics.mechanic_id = mechanics.id)"
+)
+
+
+def add_ticket_mechanics_primary_key(connection):
+    # SQLite can't add a primary key to a table: rename it, recreate it and refill it with the distinct rows
+    # that still have their service ticket and mechanic (the same works on PostgreSQL). Returns the rows dropped
+    if inspect(connection).get_pk_constraint("ticket_mechanics")["constrained_columns"]:
+        return 0
+    before = connection.execute(select(func.count()).select_from(ticket_mechanics)).scalar()
+    connection.execute(text("ALTER TABLE ticket_mechanics RENAME TO ticket_mechanics_old"))
+    ticket_mechanics.create(connection)
+    connection.execute(text(
+        "INSERT INTO ticket_mechanics (service_ticket_id, mechanic_id) "
+        "SELECT DISTINCT service_ticket_id, mechanic_id FROM ticket_mechanics_old "
+        "WHERE service_ticket_id IN (SELECT id FROM service_tickets) AND mechanic_id IN (SELECT id FROM mechanics)"
+    ))
+    connection.execute(text("DROP TABLE ticket_mechanics_old"))
+    return before - connection.execute(select(func.count()).select_from(ticket_mechanics)).scalar()
+
+
+def upgrade(connection):
+    # Composite primary key on ticket_mechanics and indexes on every foreign key
+    if add_ticket_mechanics_primary_key(connection):
+        # Duplicate and orphaned assignments were counted in ticket_count too
+        connection.execute(TICKET_COUNTS)
+    create_missing_indexes(connection, INDEXES)
+
@@ -0,0 +1,40 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Index, inspect, select, insert
+
+metadata = MetaData()
+search_trigrams = Table(
+    "search_trigrams",
+    metadata,
+    Column("entity", String(50), primary_key=True),
+    Column("trigram", String(3), primary_key=True),
+    Column("entity_id", Integer, primary_key=True),
+    Index("ix_search_trigrams_entity_id", "entity_id", "entity")
+)
+customers = Table("customers", metadata, Column("id", Integer, primary_key=True), Column("email", String(350)))
+part_descriptions = Table("part_descriptions", metadata, Column("id", Integer, primary_key=True), Column("name", String(225)))
+# entity -> searchable column, as the search index was first built
+SEARCHABLE = {
+    "customers" : customers.c.email,
+    "part_descriptions" : part_descriptions.c.name,
+}
+BATCH_SIZE = 1000
+
+
+def trigrams(value):
+    value = (value or "").lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def upgrade(connection):
+    # Trigram index for customer email / part description name search, filled from the existing rows
+    if inspect(connection).has_table("search_trigrams"):
+        return
+    search_trigrams.create(connection)
+    for entity, column in SEARCHABLE.items():
+        rows = []
+        for entity_id, value in connection.execute(select(column.table.c.id, column)):
+            rows.extend({"entity" : entity, "trigram" : trigram, "entity_id" : entity_id} for trigram in trigrams(value))
+            if len(rows) >= BATCH_SIZE:
+                connection.execute(insert(search_trigrams), rows)
+                rows = []
+        if rows:
+            connection.execute(insert(search_trigrams), rows)
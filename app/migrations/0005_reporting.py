@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, Date, DateTime, Index, inspect, text
+from app.migrations import create_missing_indexes
+
+metadata = MetaData()
+service_tickets = Table("service_tickets", metadata, Column("id", Integer, primary_key=True),
+                        Column("created_at", DateTime), Column("updated_at", DateTime))
+part_descriptions = Table("part_descriptions", metadata, Column("id", Integer, primary_key=True), Column("updated_at", DateTime))
+INDEXES = [
+    Index("ix_service_tickets_created_at", service_tickets.c.created_at),
+    Index("ix_service_tickets_updated_at", service_tickets.c.updated_at),
+    Index("ix_part_descriptions_updated_at", part_descriptions.c.updated_at),
+]
+TIMESTAMPS = {
+    "service_tickets" : ["created_at", "updated_at"],
+    "part_descriptions" : ["updated_at"],
+}
+
+REPORT_TABLES = [
+    Table(
+        "report_daily",
+        metadata,
+        Column("day", Date, primary_key=True),
+        Column("tickets", Integer, nullable=False),
+        Column("labor", Float, nullable=False),
+        Column("parts", Float, nullable=False)
+    ),
+    Table(
+        "report_mechanic_daily",
+        metadata,
+        Column("day", Date, primary_key=True),
+        Column("mechanic_id", Integer, primary_key=True),
+        Column("tickets", Integer, nullable=False),
+        Column("revenue", Float, nullable=False)
+    ),
+    Table(
+        "report_customer_daily",
+        metadata,
+        Column("day", Date, primary_key=True),
+        Column("customer_id", Integer, primary_key=True),
+        Column("tickets", Integer, nullable=False),
+        Column("revenue", Float, nullable=False)
+    ),
+    Table(
+        "report_parts_daily",
+        metadata,
+        Column("day", Date, primary_key=True),
+        Column("made_in", String(200), primary_key=True),
+        Column("parts", Integer, nullable=False),
+        Column("revenue", Float, nullable=False)
+    ),
+    Table(
+        "report_pending_days",
+        metadata,
+        Column("day", Date, nullable=False)
+    ),
+    Table(
+        "report_watermark",
+        metadata,
+        Column("name", String(50), primary_key=True),
+        Column("watermark", DateTime, nullable=False),
+        Column("refreshed_at", DateTime, nullable=False)
+    ),
+]
+
+
+def upgrade(connection):
+    # Timestamps the reporting rollups need and the rollup tables, which the first `flask refresh-reports` fills.
+    # Existing rows get the migration time: their real creation day is unknown. The DEFAULT stays on the columns,
+    # which is harmless: the models always set both timestamps themselves.
+    column_type = DateTime().compile(dialect=connection.dialect)
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+    inspector = inspect(connection)
+    for table, names in TIMESTAMPS.items():
+        columns = [column["name"] for column in inspector.get_columns(table)]
+        for name in names:
+            if name not in columns:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type} NOT NULL DEFAULT '{now}'"))
+    create_missing_indexes(connection, INDEXES)
+    for table in REPORT_TABLES:
+        table.create(connection, checkfirst=True)
+
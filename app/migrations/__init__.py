@@ -0,0 +1,79 @@
+import importlib
+import pkgutil
+import re
+from datetime import datetime, timezone
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, select, insert, func, text, inspect
+
+# Versioned schema migrations. Every script in this package is named <version>_<name>.py and defines
+# upgrade(connection). Scripts are frozen: they declare the tables and SQL they need themselves and never
+# import app.models or app.utils, so a later model change can't change what an old step does. A new database
+# goes through every step from the original tables of 0001_baseline. Scripts must also be idempotent (check
+# before they add a table, column or index): databases made by db.create_all() before migrations existed are
+# upgraded from version 0 and may already have what a step adds.
+#
+# `flask db-upgrade` (gunicorn.conf.py runs it once in the master before forking workers) applies the
+# scripts newer than the highest version in schema_version, each in its own transaction with its row.
+SCRIPT_NAME = re.compile(r"^(\d+)_\w+$")
+# Any constant works, it only has to be the same for every process upgrading the same PostgreSQL database
+ADVISORY_LOCK_ID = 20240917
+
+metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False)
+)
+
+
+def migrations():
+    # (version, module name) of every script in the package, in order
+    found = []
+    for module in pkgutil.iter_modules(__path__):
+        match = SCRIPT_NAME.match(module.name)
+        if match:
+            found.append((int(match.group(1)), module.name))
+    return sorted(found)
+
+
+def lock(connection):
+    # Serialize concurrent upgrades (several hosts, or one started by hand) before the version is read
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id" : ADVISORY_LOCK_ID})
+    elif connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def current_version(connection):
+    schema_version.create(connection, checkfirst=True)
+    return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def create_missing_indexes(connection, indexes):
+    # The given indexes (declared on a script's own tables) that the database doesn't have yet
+    inspector = inspect(connection)
+    existing = {}
+    for index in indexes:
+        table = index.table.name
+        if table not in existing:
+            existing[table] = {found["name"] for found in inspector.get_indexes(table)}
+        if index.name not in existing[table]:
+            index.create(connection)
+
+
+def upgrade(engine, target=None):
+    # Apply the pending migrations up to `target` (all by default), return the names applied
+    applied = []
+    for version, name in migrations():
+        if target is not None and version > target:
+            break
+        with engine.begin() as connection:
+            lock(connection)
+            if version <= current_version(connection):
+                continue
+            importlib.import_module(f"{__name__}.{name}").upgrade(connection)
+            connection.execute(insert(schema_version).values(version=version, name=name, applied_at=datetime.now(timezone.utc)))
+        applied.append(name)
+    return applied
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Table, Column, Integer, ForeignKey, Float
+from datetime import datetime, timezone
+from sqlalchemy import String, Table, Column, Integer, ForeignKey, Float, Index, Date, DateTime
 
 
 class Base(DeclarativeBase):
@@ -9,11 +10,29 @@ class Base(DeclarativeBase):
 db = SQLAlchemy(model_class = Base)
 
 
+def utcnow():
+    # Naive UTC, what the DateTime columns store
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# The composite primary key stops a mechanic being assigned twice and serves service_ticket.mechanics,
+# the (mechanic_id, service_ticket_id) index serves mechanic.tickets
 ticket_mechanics = Table(
     "ticket_mechanics",
     Base.metadata,
-    Column("service_ticket_id", Integer, ForeignKey("service_tickets.id"),nullable=False),
-    Column("mechanic_id", Integer, ForeignKey("mechanics.id"),nullable=False)
+    Column("service_ticket_id", Integer, ForeignKey("service_tickets.id"), primary_key=True),
+    Column("mechanic_id", Integer, ForeignKey("mechanics.id"), primary_key=True),
+    Index("ix_ticket_mechanics_mechanic_id", "mechanic_id", "service_ticket_id")
+)
+
+# Trigram index used to search customers by email and part descriptions by name
+search_trigrams = Table(
+    "search_trigrams",
+    Base.metadata,
+    Column("entity", String(50), primary_key=True),
+    Column("trigram", String(3), primary_key=True),
+    Column("entity_id", Integer, primary_key=True),
+    Index("ix_search_trigrams_entity_id", "entity_id", "entity")
 )
 
 class Customers(Base):
@@ -33,10 +52,13 @@ class Service_tickets(Base):
     __tablename__ = "service_tickets"
 
     id : Mapped[int] = mapped_column(primary_key=True)
-    customer_id : Mapped[int] = mapped_column(Integer, ForeignKey('customers.id'), nullable=False)
+    customer_id : Mapped[int] = mapped_column(Integer, ForeignKey('customers.id'), nullable=False, index=True)
     service_desc : Mapped[str] = mapped_column(String(400), nullable=True)
     price : Mapped[float] = mapped_column(Float, nullable=False)
     VIN : Mapped[str] = mapped_column(String(100), nullable=False)
+    # The reporting rollups group tickets by the day they were created (see app/utils/reporting.py)
+    created_at : Mapped[datetime] = mapped_column(DateTime, nullable=False, default=utcnow, index=True)
+    updated_at : Mapped[datetime] = mapped_column(DateTime, nullable=False, default=utcnow, onupdate=utcnow, index=True)
     # Relationship with customer
     customer : Mapped["Customers"] = relationship("Customers", back_populates="service_tickets")
     # Relationship with mechanics
@@ -56,16 +78,21 @@ class Mechanics(Base):
     phone : Mapped[str] = mapped_column(String(50), nullable=False)
     address : Mapped[str] = mapped_column(String(500), nullable=True)
     salary : Mapped[float] = mapped_column(Float, nullable=False)
+    # Number of service_tickets assigned to the mechanic, kept in sync with ticket_mechanics
+    ticket_count : Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     # Relationship with service_tickets
     tickets : Mapped[list["Service_tickets"]] = relationship("Service_tickets", secondary=ticket_mechanics, back_populates="mechanics")
 
+# Workload ranking reads the top mechanics straight from this index
+Index("ix_mechanics_workload", Mechanics.ticket_count.desc(), Mechanics.id)
+
 
 class Parts(Base):
     __tablename__ = "parts"
 
     id : Mapped[int] = mapped_column(primary_key=True)
-    ticket_id : Mapped[int] = mapped_column(Integer, ForeignKey('service_tickets.id'), nullable=True)
-    desc_id : Mapped[int] = mapped_column(Integer, ForeignKey('part_descriptions.id'),nullable=False)
+    ticket_id : Mapped[int] = mapped_column(Integer, ForeignKey('service_tickets.id'), nullable=True, index=True)
+    desc_id : Mapped[int] = mapped_column(Integer, ForeignKey('part_descriptions.id'),nullable=False, index=True)
     serial_number : Mapped[str] = mapped_column(String(50), nullable=False, unique=True)
     # Relationship with service_tickets
     service_ticket : Mapped["Service_tickets"] = relationship("Service_tickets", back_populates="parts")
@@ -79,5 +106,60 @@ class PartDescriptions(Base):
     name: Mapped[str] = mapped_column(String(225), nullable=False)
     price: Mapped[float] = mapped_column(Float, nullable=False)
     made_in : Mapped[str] = mapped_column(String(200), nullable=False)
+    updated_at : Mapped[datetime] = mapped_column(DateTime, nullable=False, default=utcnow, onupdate=utcnow, index=True)
     # Relationship with parts
     parts : Mapped[list["Parts"]] = relationship("Parts", back_populates="part_description")
+
+
+# Daily reporting rollups, rebuilt for the days queued in report_pending_days
+report_daily = Table(
+    "report_daily",
+    Base.metadata,
+    Column("day", Date, primary_key=True),
+    Column("tickets", Integer, nullable=False),
+    Column("labor", Float, nullable=False),
+    Column("parts", Float, nullable=False)
+)
+
+# No foreign keys on the rollups: they are rebuilt from the live tables, not kept in sync with them
+report_mechanic_daily = Table(
+    "report_mechanic_daily",
+    Base.metadata,
+    Column("day", Date, primary_key=True),
+    Column("mechanic_id", Integer, primary_key=True),
+    Column("tickets", Integer, nullable=False),
+    Column("revenue", Float, nullable=False)
+)
+
+report_customer_daily = Table(
+    "report_customer_daily",
+    Base.metadata,
+    Column("day", Date, primary_key=True),
+    Column("customer_id", Integer, primary_key=True),
+    Column("tickets", Integer, nullable=False),
+    Column("revenue", Float, nullable=False)
+)
+
+report_parts_daily = Table(
+    "report_parts_daily",
+    Base.metadata,
+    Column("day", Date, primary_key=True),
+    Column("made_in", String(200), primary_key=True),
+    Column("parts", Integer, nullable=False),
+    Column("revenue", Float, nullable=False)
+)
+
+# Days changed by a write since the last refresh, one row per write (the refresh takes them all off at once)
+report_pending_days = Table(
+    "report_pending_days",
+    Base.metadata,
+    Column("day", Date, nullable=False)
+)
+
+report_watermark = Table(
+    "report_watermark",
+    Base.metadata,
+    Column("name", String(50), primary_key=True),
+    Column("watermark", DateTime, nullable=False),
+    Column("refreshed_at", DateTime, nullable=False)
+)
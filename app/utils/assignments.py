@@ -0,0 +1,81 @@
+from sqlalchemy import insert, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, ticket_mechanics, Parts
+from app.utils.ranking import adjust_ticket_counts
+from app.utils.reporting import queue_service_tickets
+
+CONFLICT_INSERTS = {
+    "postgresql" : postgresql.insert,
+    "sqlite" : sqlite.insert,
+}
+
+
+def insert_ignore(table):
+    # INSERT ... ON CONFLICT DO NOTHING on the dialects that have it, a plain INSERT elsewhere
+    dialect_insert = CONFLICT_INSERTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is None:
+        return insert(table)
+    return dialect_insert(table).on_conflict_do_nothing()
+
+
+def assign_mechanics(service_ticket_id, mechanic_ids):
+    # Assign existing mechanics with one INSERT, skipping the ones already assigned. Keeps Mechanics.ticket_count
+    # in sync, the caller commits. Returns the ids actually assigned
+    if not mechanic_ids:
+        return []
+    rows = [{"service_ticket_id" : service_ticket_id, "mechanic_id" : mechanic_id} for mechanic_id in mechanic_ids]
+    assigned = db.session.scalars(insert_ignore(ticket_mechanics).returning(ticket_mechanics.c.mechanic_id), rows).all()
+    if assigned:
+        adjust_ticket_counts(assigned, 1)
+        queue_service_tickets([service_ticket_id])
+    return assigned
+
+
+def unassign_mechanics(service_ticket_id, mechanic_ids):
+    # Remove mechanics with one DELETE on the join table, keeping Mechanics.ticket_count in sync, the caller commits.
+    # Returns the ids actually removed
+    if not mechanic_ids:
+        return []
+    statement = (
+        delete(ticket_mechanics)
+        .where(ticket_mechanics.c.service_ticket_id == service_ticket_id, ticket_mechanics.c.mechanic_id.in_(mechanic_ids))
+        .returning(ticket_mechanics.c.mechanic_id)
+    )
+    removed = db.session.scalars(statement).all()
+    if removed:
+        adjust_ticket_counts(removed, -1)
+        queue_service_tickets([service_ticket_id])
+    return removed
+
+
+def attach_parts(service_ticket_id, part_ids):
+    # Attach parts in stock with one UPDATE, the caller commits. Parts already used in a service ticket
+    # (this one included) are left alone. Returns the ids attached
+    if not part_ids:
+        return []
+    statement = (
+        update(Parts)
+        .where(Parts.id.in_(part_ids), Parts.ticket_id.is_(None))
+        .values(ticket_id=service_ticket_id)
+        .returning(Parts.id)
+    )
+    attached = db.session.scalars(statement).all()
+    if attached:
+        queue_service_tickets([service_ticket_id])
+    return attached
+
+
+def detach_parts(service_ticket_id, part_ids):
+    # Put parts of this service ticket back in stock with one UPDATE, the caller commits. Returns the ids detached.
+    if not part_ids:
+        return []
+    statement = (
+        update(Parts)
+        .where(Parts.id.in_(part_ids), Parts.ticket_id == service_ticket_id)
+        .values(ticket_id=None)
+        .returning(Parts.id)
+    )
+    detached = db.session.scalars(statement).all()
+    if detached:
+        queue_service_tickets([service_ticket_id])
+    return detached
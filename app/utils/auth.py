@@ -1,13 +1,24 @@
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from functools import wraps
-from flask import request,jsonify
+from collections import OrderedDict
+from flask import request,jsonify, g
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+from app.models import db, Customers, Mechanics
 import jose
 import os
+import threading
+import time
 
 
 SECRET_KEY = os.environ.get('SECRET_KEY') or 'SUPER Secret secret Code'
 
+PRINCIPAL_MODELS = {
+    "customer" : Customers,
+    "mechanic" : Mechanics
+}
+
 def encode_token(id, role):
     payload = {
         'iat' : datetime.now(timezone.utc), #issued 
@@ -20,7 +31,84 @@ def encode_token(id, role):
     return token
 
 
-def token_required(f):
+# Bounded LRU cache of verified tokens -> (sub, role, exp), a hit skips jwt.decode.
+# Entries are dropped once their exp has passed, so expired tokens are still rejected by jwt.decode.
+class TokenCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[2] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry
+
+    def put(self, token, sub, role, exp):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (sub, role, exp)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def invalidate_subject(self, sub, role):
+        # Drop every cached token of one user, e.g. when the account is deleted
+        with self._lock:
+            for token in [token for token, entry in self._entries.items() if entry[:2] == (str(sub), role)]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size" : len(self._entries),
+                "maxsize" : self.maxsize,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions,
+                "hit_rate" : self.hits / lookups if lookups else 0.0
+            }
+
+token_cache = TokenCache()
+
+
+def decode_token(token):
+    cached = token_cache.get(token)
+    if cached:
+        return cached
+    data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    token_cache.put(token, data['sub'], data['role'], data['exp'])
+    return data['sub'], data['role'], data['exp']
+
+
+def token_required(f=None, *, role=None, load=False, columns=None, options=()):
+    # Bare it only sets request.user_id / user_role; role= rejects other roles before the view runs and
+    # load=True loads the principal once (only `columns`, with loader `options`) onto g.principal
+    if f is None:
+        return lambda f: token_required(f, role=role, load=load, columns=columns, options=options)
+
     @wraps(f)
     def decorator(*args, **kwargs):
         token = None
@@ -30,13 +118,32 @@ def token_required(f):
         if not token:
             return jsonify({"error": "token missing from authorization headers"}), 401
         try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            request.user_id = data['sub']
-            request.user_role = data['role']
+            request.user_id, request.user_role, _ = decode_token(token)
         except jose.exceptions.ExpiredSignatureError:
             return jsonify({'message':'token is expired'}), 403
         except jose.exceptions.JWTError:
             return jsonify({'message':'invalid token'}), 401
+        if role is not None and request.user_role != role:
+            return jsonify({"message" : f"{request.user_role} is not allowed."}), 400
+        if load and load_principal(columns, options) is None:
+            return jsonify({"error" : f"{request.user_role.capitalize()} with id: {request.user_id} not found."}), 404
         return f(*args, **kwargs)
     return decorator
-    
\ No newline at end of file
+
+
+def load_principal(columns=None, options=()):
+    # One SELECT per request for the authenticated customer / mechanic, reused through g.principal
+    if "principal" not in g:
+        model = PRINCIPAL_MODELS.get(request.user_role)
+        if model is None:
+            g.principal = None
+            return None
+        query = select(model).where(model.id == int(request.user_id)).options(*options)
+        if columns:
+            query = query.options(load_only(*[getattr(model, column) for column in columns]))
+        g.principal = db.session.scalars(query).first()
+    return g.principal
+
+
+def current_principal():
+    return g.get("principal")
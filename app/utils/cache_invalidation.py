@@ -0,0 +1,155 @@
+from flask import has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, Null
+from app.models import db, Customers, Mechanics, Service_tickets, Parts, PartDescriptions
+from app.utils.caching import invalidate_tags
+
+# Collects the cache tags touched by a transaction on session.info and invalidates them once it commits.
+# ORM flushes give us the exact rows, bulk UPDATE / DELETE / INSERT statements are narrowed down from their
+# WHERE clause and values; when a statement can't be pinned to specific tickets it bumps "service_tickets:*",
+# which every per-ticket view is also cached under.
+PENDING_TAGS = "pending_cache_tags"
+ALL_TICKETS_TAG = "service_tickets:*"
+
+TABLE_TAGS = {
+    "customers" : {"customers"},
+    "mechanics" : {"mechanics"},
+    "service_tickets" : {"service_tickets"},
+    "parts" : {"parts"},
+    "part_descriptions" : {"part_descriptions", "parts"},
+    "ticket_mechanics" : {"mechanics"},
+    "report_daily" : {"reports"},
+    "report_mechanic_daily" : {"reports"},
+    "report_customer_daily" : {"reports"},
+    "report_parts_daily" : {"reports"},
+    "report_watermark" : {"reports"},
+}
+
+# Column holding the service ticket id in each table whose rows show up in per-ticket views
+TICKET_COLUMNS = {
+    "service_tickets" : "id",
+    "parts" : "ticket_id",
+    "ticket_mechanics" : "service_ticket_id",
+}
+
+
+def ticket_tags(ticket_ids):
+    return {f"service_ticket:{ticket_id}" for ticket_id in ticket_ids if ticket_id is not None}
+
+
+def history_values(obj, attribute):
+    history = inspect(obj).attrs[attribute].history
+    return list(history.added) + list(history.unchanged) + list(history.deleted)
+
+
+def changed(obj, attribute):
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+
+def object_tags(obj):
+    if isinstance(obj, Customers):
+        return {"customers"}
+    if isinstance(obj, Mechanics):
+        tags = {"mechanics"}
+        if changed(obj, "tickets"):
+            tags |= ticket_tags(ticket.id for ticket in history_values(obj, "tickets"))
+        return tags
+    if isinstance(obj, Service_tickets):
+        tags = {"service_tickets"} | ticket_tags([obj.id])
+        if changed(obj, "mechanics"):
+            tags.add("mechanics")
+        return tags
+    if isinstance(obj, Parts):
+        return {"parts"} | ticket_tags(history_values(obj, "ticket_id"))
+    if isinstance(obj, PartDescriptions):
+        return {"part_descriptions", "parts"}
+    return set()
+
+
+def where_values(whereclause, column_name):
+    # Values a WHERE clause pins column_name to (== / IN / IS NULL), or None when it doesn't constrain it
+    if whereclause is None:
+        return None
+    values = None
+    for element in visitors.iterate(whereclause):
+        if not isinstance(element, BinaryExpression) or getattr(element.left, "key", None) != column_name:
+            continue
+        if element.operator is operators.eq and isinstance(element.right, BindParameter):
+            values = (values or []) + [element.right.effective_value]
+        elif element.operator is operators.in_op and isinstance(element.right, BindParameter):
+            values = (values or []) + list(element.right.effective_value)
+        elif element.operator is operators.is_ and isinstance(element.right, Null):
+            values = (values or []) + [None]
+    return values
+
+
+def statement_ticket_ids(orm_execute_state, column_name):
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_insert:
+        rows = orm_execute_state.parameters or []
+        rows = [rows] if isinstance(rows, dict) else rows
+        if rows:
+            return [row.get(column_name) for row in rows]
+        return None
+    ticket_ids = where_values(statement.whereclause, column_name)
+    if orm_execute_state.is_update:
+        new_values = {getattr(key, "key", key) : value for key, value in (getattr(statement, "_values", None) or {}).items()}
+        if column_name in new_values:
+            new_value = new_values[column_name]
+            if not isinstance(new_value, BindParameter) or ticket_ids is None:
+                return None
+            ticket_ids = ticket_ids + [new_value.effective_value]
+    return ticket_ids
+
+
+def statement_tags(orm_execute_state):
+    table = getattr(orm_execute_state.statement, "table", None)
+    table_name = getattr(table, "name", None)
+    tags = set(TABLE_TAGS.get(table_name, ()))
+    if table_name in TICKET_COLUMNS:
+        ticket_ids = statement_ticket_ids(orm_execute_state, TICKET_COLUMNS[table_name])
+        tags |= {ALL_TICKETS_TAG} if ticket_ids is None else ticket_tags(ticket_ids)
+    return tags
+
+
+def pending_tags(session):
+    return session.info.setdefault(PENDING_TAGS, set())
+
+
+def after_flush(session, flush_context):
+    tags = pending_tags(session)
+    for obj in list(session.new) + list(session.deleted):
+        tags |= object_tags(obj)
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            tags |= object_tags(obj)
+
+
+def do_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        pending_tags(orm_execute_state.session).update(statement_tags(orm_execute_state))
+
+
+def after_commit(session):
+    tags = session.info.pop(PENDING_TAGS, set())
+    if tags and has_app_context():
+        invalidate_tags(*sorted(tags))
+
+
+def after_rollback(session):
+    session.info.pop(PENDING_TAGS, None)
+
+
+def invalidate_all():
+    # For writes the session events don't see, like migrations on a bare connection
+    invalidate_tags(*sorted(set().union(*TABLE_TAGS.values()) | {ALL_TICKETS_TAG}))
+
+
+def register_cache_invalidation():
+    if event.contains(db.session, "after_commit", after_commit):
+        return
+    event.listen(db.session, "after_flush", after_flush)
+    event.listen(db.session, "do_orm_execute", do_orm_execute)
+    event.listen(db.session, "after_commit", after_commit)
+    event.listen(db.session, "after_rollback", after_rollback)
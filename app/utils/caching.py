@@ -0,0 +1,40 @@
+import uuid
+from flask import request, current_app
+from app.extensions import cache
+
+# Every tag has a version stored in the cache itself. Cached views put the versions of their tags
+# in their key, so bumping a tag's version makes every view cached under it unreachable at once.
+# With a shared backend (FileSystemCache, RedisCache) the invalidation is seen by every worker.
+TAG_PREFIX = "tag:"
+
+
+def tag_versions(tags):
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(*keys)
+    missing = {key : uuid.uuid4().hex for key, version in zip(keys, versions) if version is None}
+    if missing:
+        cache.set_many(missing, timeout=0)
+    return [version or missing[key] for key, version in zip(keys, versions)]
+
+
+def invalidate_tags(*tags):
+    if tags:
+        cache.set_many({TAG_PREFIX + tag : uuid.uuid4().hex for tag in tags}, timeout=0)
+
+
+def is_ok(rv):
+    # Only 200s are cached: an error like a 404 for a row written outside db.session would otherwise stick
+    return current_app.make_response(rv).status_code == 200
+
+
+def cached_view(*tags, timeout=None, unless=None):
+    # Tags may use the view arguments ("service_ticket:{service_ticket_id}") or be a function returning the
+    # request's tags. The key covers the full path with its query string, so every page / filter is cached apart
+    def make_cache_key():
+        view_tags = []
+        for tag in tags:
+            view_tags.extend(tag() if callable(tag) else [tag.format(**(request.view_args or {}))])
+        versions = ",".join(tag_versions(view_tags))
+        return f"view:{request.full_path}:{versions}"
+
+    return cache.cached(timeout=timeout, key_prefix=make_cache_key, unless=unless, response_filter=is_ok)
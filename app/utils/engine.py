@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from sqlalchemy import exc, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from app.models import db
+
+
+# QueuePool recording how long checkouts wait (wait_max / wait_total) and how often they give up after
+# pool_timeout (timeouts). Either one growing means the pool is too small for the load.
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        with self._metrics_lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.max_checked_out = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.max_checked_out = max(self.max_checked_out, self.checkedout())
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool, keep the counters going
+        pool = super().recreate()
+        pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+        pool.wait_total, pool.wait_max, pool.max_checked_out = self.wait_total, self.wait_max, self.max_checked_out
+        return pool
+
+    def stats(self):
+        with self._metrics_lock:
+            return {
+                "pid" : os.getpid(),
+                "size" : self.size(),
+                "checked_out" : self.checkedout(),
+                "overflow" : max(self.overflow(), 0),
+                "max_overflow" : self._max_overflow,
+                "max_checked_out" : self.max_checked_out,
+                "checkouts" : self.checkouts,
+                "timeouts" : self.timeouts,
+                "wait_avg_ms" : self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                "wait_max_ms" : self.wait_max * 1000
+            }
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return {"pid" : os.getpid(), "status" : pool.status()}
+
+
+def pool_size(config):
+    # Every gunicorn worker has its own pool and each of its threads holds at most one connection,
+    # so the pool only needs one connection per thread. DB_MAX_CONNECTIONS caps the total across workers.
+    if config.get("DB_POOL_SIZE"):
+        return config["DB_POOL_SIZE"]
+    size = max(config.get("WEB_THREADS", 1), 1)
+    max_connections = config.get("DB_MAX_CONNECTIONS")
+    if max_connections:
+        size = min(size, max(max_connections // max(config.get("WEB_CONCURRENCY", 1), 1), 1))
+    return size
+
+
+def postgres_engine_options(config):
+    size = pool_size(config)
+    statement_timeout = config.get("DB_STATEMENT_TIMEOUT_MS", 0)
+    connect_args = {
+        "connect_timeout" : config.get("DB_CONNECT_TIMEOUT", 10),
+        "application_name" : config.get("DB_APPLICATION_NAME", "mechanic_app")
+    }
+    if statement_timeout:
+        # Enforced by the server, a runaway query is cancelled instead of holding its connection forever
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+    return {
+        "poolclass" : InstrumentedQueuePool,
+        "pool_size" : size,
+        "max_overflow" : config.get("DB_MAX_OVERFLOW", size // 2),
+        "pool_timeout" : config.get("DB_POOL_TIMEOUT", 10),
+        "pool_recycle" : config.get("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping" : config.get("DB_POOL_PRE_PING", True),
+        "connect_args" : connect_args
+    }
+
+
+def sqlite_pragmas(pragmas):
+    # Connect listener running the PRAGMAs on every new DBAPI connection, in the given order
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return set_pragmas
+
+
+def register_sqlite_pragmas(app, pragmas=None):
+    # Apply SQLITE_PRAGMAS (or `pragmas`) to every connection of the app's SQLite engine.
+    # Must run after db.init_app, does nothing for other databases
+    pragmas = pragmas or app.config.get("SQLITE_PRAGMAS")
+    if not pragmas or make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() != "sqlite":
+        return
+    with app.app_context():
+        event.listen(db.engine, "connect", sqlite_pragmas(pragmas))
+
+
+def configure_engine(app):
+    # Fill SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings for the database in use, must run before db.init_app.
+    # Options set explicitly in SQLALCHEMY_ENGINE_OPTIONS win
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    options = {}
+    if url.get_backend_name() == "postgresql":
+        options = postgres_engine_options(app.config)
+    elif url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        options = {"poolclass" : InstrumentedQueuePool}
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
@@ -0,0 +1,70 @@
+import base64
+import binascii
+import json
+from flask import request, jsonify, current_app
+from sqlalchemy import select, func
+from app.models import db
+from app.utils.projection import project
+
+DEFAULT_PAGE_SIZE = 20
+
+
+def encode_cursor(last_id):
+    # Cursors are opaque to clients, they only hand back what we gave them
+    raw = json.dumps({"id" : last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_id = json.loads(raw)["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError(f"invalid cursor: {cursor}")
+    if not isinstance(last_id, int):
+        raise ValueError(f"invalid cursor: {cursor}")
+    return last_id
+
+
+def paginate(query, model, schema):
+    # ?after=<cursor>&limit=<n> opts in to keyset pagination, otherwise classic ?page=&per_page= pagination.
+    # ?fields= narrows both the SELECT and the dump
+    try:
+        schema, loader = project(model, schema)
+    except ValueError as e:
+        return jsonify({"error" : str(e)}), 400
+    query = query.options(loader)
+    max_page_size = current_app.config.get("MAX_PAGE_SIZE", 100)
+    if "after" in request.args or "limit" in request.args:
+        return keyset_paginate(query, model, schema, max_page_size)
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    # No COUNT(*) and no full-table fallback: a page out of range is just an empty page
+    items = db.paginate(query.order_by(model.id), page=page, per_page=per_page,
+                        max_per_page=max_page_size, error_out=False, count=False).items
+    return schema.jsonify(items), 200
+
+
+def keyset_paginate(query, model, schema, max_page_size):
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit <= 0:
+        return jsonify({"error" : "limit can not be 0 or negative"}), 400
+    limit = min(limit, max_page_size)
+    page_query = query
+    after = request.args.get('after')
+    if after:
+        try:
+            page_query = query.where(model.id > decode_cursor(after))
+        except ValueError as e:
+            return jsonify({"error" : str(e)}), 400
+    # Fetch one extra row to know if there is a next page without counting
+    items = db.session.scalars(page_query.order_by(model.id).limit(limit + 1)).all()
+    has_next = len(items) > limit
+    items = items[:limit]
+    response = {
+        "items" : schema.dump(items),
+        "next_cursor" : encode_cursor(items[-1].id) if has_next else None
+    }
+    if request.args.get('count', type=lambda value: value.lower() == "true"):
+        response["total"] = db.session.scalar(select(func.count()).select_from(query.subquery()))
+    return jsonify(response), 200
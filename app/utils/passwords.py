@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = None
+
+
+# Raised when too many verifications are already waiting or one took longer than allowed
+class PasswordVerificationBusy(Exception):
+    pass
+
+
+def hash_password(password):
+    # Algorithm and cost come from PASSWORD_HASH_METHOD, e.g. "scrypt" or "pbkdf2:sha256:600000"
+    return generate_password_hash(password, method=current_app.config.get("PASSWORD_HASH_METHOD", "scrypt"))
+
+
+@lru_cache(maxsize=None)
+def full_hash_method(method):
+    # werkzeug fills in default parameters ("scrypt" -> "scrypt:32768:8:1"), hash once to learn them
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def needs_rehash(password_hash):
+    return password_hash.split("$", 1)[0] != full_hash_method(current_app.config.get("PASSWORD_HASH_METHOD", "scrypt"))
+
+
+def get_executor():
+    # The pool is created lazily so every gunicorn worker gets its own after the fork
+    global _executor, _pending
+    with _executor_lock:
+        if _executor is None:
+            workers = current_app.config.get("PASSWORD_VERIFY_WORKERS", 0)
+            if workers <= 0:
+                return None
+            if current_app.config.get("PASSWORD_VERIFY_EXECUTOR", "thread") == "process":
+                _executor = ProcessPoolExecutor(max_workers=workers)
+            else:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-verify")
+            _pending = threading.BoundedSemaphore(current_app.config.get("PASSWORD_VERIFY_MAX_PENDING") or workers * 4)
+        return _executor
+
+
+def verify_password(password_hash, password):
+    executor = get_executor()
+    if executor is None:
+        return check_password_hash(password_hash, password)
+    timeout = current_app.config.get("PASSWORD_VERIFY_TIMEOUT", 5)
+    # The request thread still waits for the result, so this doesn't free workers: it only bounds how many
+    # hashes run at once (the CPU a login storm can take) and turns the excess into fast 503s
+    pending = _pending
+    if not pending.acquire(timeout=timeout):
+        raise PasswordVerificationBusy()
+    try:
+        future = executor.submit(check_password_hash, password_hash, password)
+    except BaseException:
+        pending.release()
+        raise
+    # The slot is freed when the hash is done, a caller giving up on it leaves the work in the pool
+    future.add_done_callback(lambda _: pending.release())
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        raise PasswordVerificationBusy()
+
+
+def verify_and_update(account, password):
+    # Check the password and, when the hashing parameters changed since it was stored, rehash it in place.
+    # The caller commits.
+    if not verify_password(account.password, password):
+        return False
+    if needs_rehash(account.password):
+        account.password = hash_password(password)
+    return True
+
+
+def shutdown_executor():
+    global _executor, _pending
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+        _pending = None
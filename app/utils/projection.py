@@ -0,0 +1,40 @@
+from functools import lru_cache
+from flask import request
+from sqlalchemy.orm import load_only
+
+
+def requested_fields(schema):
+    # ?fields=id,first_name,email restricts the response to these fields, None when the client didn't ask
+    raw = request.args.get("fields")
+    if raw is None:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in raw.split(",") if field.strip()))
+    if not fields:
+        raise ValueError("fields can not be empty")
+    unknown = [field for field in fields if field not in schema.dump_fields]
+    if unknown:
+        raise ValueError(f"unknown field(s): {", ".join(unknown)}")
+    return fields
+
+
+@lru_cache(maxsize=256)
+def projected_schema(schema, fields):
+    # One schema instance per field set, so its compiled serializer is built once and reused
+    return type(schema)(only=fields, many=schema.many)
+
+
+@lru_cache(maxsize=256)
+def column_loader(model, schema):
+    # Only load the mapped columns `schema` dumps: everything else (password hashes included) stays in the database
+    columns = model.__mapper__.column_attrs
+    names = [field.attribute or name for name, field in schema.dump_fields.items()]
+    return load_only(*[getattr(model, name) for name in names if name in columns])
+
+
+def project(model, schema):
+    # (schema narrowed to ?fields=, loader option for `model`), ValueError for unknown fields.
+    # Without ?fields= the schema is unchanged and the option still skips the columns it doesn't dump
+    fields = requested_fields(schema)
+    if fields is not None:
+        schema = projected_schema(schema, fields)
+    return schema, column_loader(model, schema)
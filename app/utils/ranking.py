@@ -0,0 +1,55 @@
+from collections import Counter, defaultdict
+from sqlalchemy import select, update, func
+from app.models import db, Mechanics, ticket_mechanics
+
+
+def rank_mechanics_by_work(limit=None, offset=0, options=()):
+    # Mechanics.ticket_count is maintained on every assignment change, so the ranking
+    # is a read of the ix_mechanics_workload index instead of an aggregate over ticket_mechanics.
+    # Ties are broken by mechanic id so the order is stable between pages.
+    query = (
+        select(Mechanics, Mechanics.ticket_count)
+        .options(*options)
+        .order_by(Mechanics.ticket_count.desc(), Mechanics.id)
+        .offset(offset)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    # The count comes with the row, so it is there even when `options` defer the column
+    return [(mechanic, ticket_count) for mechanic, ticket_count in db.session.execute(query)]
+
+
+def adjust_ticket_counts(mechanic_ids, delta):
+    # Runs inside the caller's transaction, so the counter is committed together with the assignment change.
+    # A mechanic id listed several times is adjusted once per occurrence.
+    ids_by_occurrences = defaultdict(list)
+    for mechanic_id, occurrences in Counter(mechanic_ids).items():
+        ids_by_occurrences[occurrences].append(mechanic_id)
+    for occurrences, ids in ids_by_occurrences.items():
+        db.session.execute(
+            update(Mechanics)
+            .where(Mechanics.id.in_(ids))
+            .values(ticket_count=Mechanics.ticket_count + delta * occurrences)
+        )
+
+
+def ticket_mechanic_ids(service_ticket_ids):
+    # Every (mechanic_id) assignment of the given tickets, one row per assignment
+    query = select(ticket_mechanics.c.mechanic_id).where(ticket_mechanics.c.service_ticket_id.in_(service_ticket_ids))
+    return db.session.scalars(query).all()
+
+
+def ticket_counts_update():
+    # Recompute every counter from ticket_mechanics with a single correlated UPDATE
+    tickets_count = (
+        select(func.count(ticket_mechanics.c.service_ticket_id))
+        .where(ticket_mechanics.c.mechanic_id == Mechanics.__table__.c.id)
+        .scalar_subquery()
+    )
+    return update(Mechanics.__table__).values(ticket_count=tickets_count)
+
+
+def rebuild_ticket_counts():
+    result = db.session.execute(ticket_counts_update())
+    db.session.commit()
+    return result.rowcount
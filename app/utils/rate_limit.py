@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import time
+from flask import request, g
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage, MovingWindowSupport
+import jose
+from app.utils.auth import decode_token
+
+# Flask-Limiter keeps its counters in memory by default, so every gunicorn worker enforces its own copy
+# of each limit. SQLiteStorage registers the "sqlite:///path/to/file.db" scheme with `limits` so workers on
+# one host can share a counter file through RATELIMIT_STORAGE_URI; across hosts use "redis://...".
+PURGE_EVERY = 1000
+
+
+def rate_limit_key():
+    # Authenticated requests are limited per user, everything else per client address.
+    # The token is only decoded here (through the token cache), token_required still does the real checks.
+    # Flask-Limiter asks once per limit on the route, so the key is kept on g for the rest of the request.
+    if "rate_limit_key" not in g:
+        g.rate_limit_key = get_remote_address()
+        authorization = request.headers.get("Authorization", "").split()
+        if len(authorization) == 2:
+            try:
+                sub, role, _ = decode_token(authorization[1])
+                g.rate_limit_key = f"{role}:{sub}"
+            except jose.exceptions.JWTError:
+                pass
+    return g.rate_limit_key
+
+
+# Rate limit storage in a SQLite file shared by every process on the host. Fixed windows are one row per key
+# (a single upsert), moving windows one row per hit taken under BEGIN IMMEDIATE. Expired rows are purged
+# every PURGE_EVERY writes.
+class SQLiteStorage(Storage, MovingWindowSupport):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        self.path = uri.split("://", 1)[1][1:] if uri else ":memory:"
+        self.timeout = float(options.pop("timeout", 5))
+        self._local = threading.local()
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._create_tables()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    @property
+    def connection(self):
+        # One connection per thread and per process, gunicorn forks after the app is created
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _create_tables(self):
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limit_counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS rate_limit_events (key TEXT NOT NULL, created_at REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS ix_rate_limit_events_key ON rate_limit_events (key, created_at);
+            """
+        )
+
+    def _maybe_purge(self, now):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self.purge(now)
+
+    def purge(self, now=None):
+        now = now or time.time()
+        self.connection.execute("DELETE FROM rate_limit_counters WHERE expires_at <= ?", (now,))
+        # Moving windows are at most a day long in this app, older hits can't count against anything
+        self.connection.execute("DELETE FROM rate_limit_events WHERE created_at <= ?", (now - 86400,))
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        value = self.connection.execute(
+            """
+            INSERT INTO rate_limit_counters (key, value, expires_at) VALUES (:key, :amount, :now + :expiry)
+            ON CONFLICT (key) DO UPDATE SET
+                value = CASE WHEN expires_at <= :now THEN :amount ELSE value + :amount END,
+                expires_at = CASE WHEN expires_at <= :now THEN :now + :expiry ELSE expires_at END
+            RETURNING value
+            """,
+            {"key" : key, "amount" : amount, "now" : now, "expiry" : expiry}
+        ).fetchone()[0]
+        self._maybe_purge(now)
+        return value
+
+    def get(self, key):
+        row = self.connection.execute(
+            "SELECT value FROM rate_limit_counters WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self.connection.execute(
+            "SELECT expires_at FROM rate_limit_counters WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self.connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        connection = self.connection
+        removed = connection.execute("DELETE FROM rate_limit_counters").rowcount
+        removed += connection.execute("DELETE FROM rate_limit_events").rowcount
+        return removed
+
+    def clear(self, key):
+        self.connection.execute("DELETE FROM rate_limit_counters WHERE key = ?", (key,))
+        self.connection.execute("DELETE FROM rate_limit_events WHERE key = ?", (key,))
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM rate_limit_events WHERE key = ? AND created_at <= ?", (key, now - expiry))
+            count = connection.execute("SELECT count(*) FROM rate_limit_events WHERE key = ?", (key,)).fetchone()[0]
+            if count + amount > limit:
+                connection.execute("COMMIT")
+                return False
+            connection.executemany("INSERT INTO rate_limit_events (key, created_at) VALUES (?, ?)", [(key, now)] * amount)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._maybe_purge(now)
+        return True
+
+    def get_moving_window(self, key, limit, expiry):
+        now = time.time()
+        oldest, count = self.connection.execute(
+            "SELECT min(created_at), count(*) FROM rate_limit_events WHERE key = ? AND created_at > ?", (key, now - expiry)
+        ).fetchone()
+        return (oldest, count) if count else (now, 0)
@@ -0,0 +1,144 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import event, inspect, select, insert, delete, func, and_, or_, true, Date
+from app.models import (db, utcnow, Service_tickets, Parts, PartDescriptions, ticket_mechanics, report_daily,
+                        report_mechanic_daily, report_customer_daily, report_parts_daily, report_pending_days, report_watermark)
+from app.utils.totals import parts_totals
+
+# Rollups are per day (the day a service ticket was created). Every write that changes what a day adds up to queues
+# that day in report_pending_days, in the writer's own transaction: tickets created, updated or deleted, tickets whose
+# mechanics or parts change and tickets using a part description whose price or made_in changes. A refresh rebuilds
+# only the queued days, so it never reads the whole ticket table and a slow writer is picked up by the refresh after
+# its commit. Rebuilding whole days keeps every step idempotent.
+ROLLUPS = [report_daily, report_mechanic_daily, report_customer_daily, report_parts_daily]
+WATERMARK_NAME = "rollups"
+
+
+def day_of(column):
+    # date() is a function on SQLite and PostgreSQL
+    return func.date(column, type_=Date)
+
+
+def queue_ticket_days(ticket_filter, connection=None):
+    # Queue the days of the tickets matched by ticket_filter for the next refresh, the caller commits.
+    # Deleted tickets have to be queued before they are deleted
+    days = select(day_of(Service_tickets.created_at)).where(ticket_filter).distinct()
+    (connection or db.session).execute(insert(report_pending_days).from_select(["day"], days))
+
+
+def queue_service_tickets(service_ticket_ids):
+    # Queue the days of tickets whose mechanics or parts change
+    service_ticket_ids = [ticket_id for ticket_id in set(service_ticket_ids) if ticket_id is not None]
+    if service_ticket_ids:
+        queue_ticket_days(Service_tickets.id.in_(service_ticket_ids))
+
+
+def queue_flushed_changes(session, flush_context):
+    # ORM writes queue their days on the flush that sends them: new and changed tickets (created_at is known),
+    # and every ticket using a part description whose price or made_in changed
+    connection = session.connection()
+    days = set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Service_tickets) and (obj in session.new or session.is_modified(obj)):
+            days.add(obj.created_at.date())
+        elif isinstance(obj, PartDescriptions) and obj in session.dirty:
+            state = inspect(obj)
+            if state.attrs.price.history.has_changes() or state.attrs.made_in.history.has_changes():
+                queue_ticket_days(Service_tickets.parts.any(Parts.desc_id == obj.id), connection)
+    if days:
+        connection.execute(insert(report_pending_days), [{"day" : day} for day in days])
+
+
+def register_report_queue():
+    if not event.contains(db.session, "after_flush", queue_flushed_changes):
+        event.listen(db.session, "after_flush", queue_flushed_changes)
+
+
+def days_filter(days):
+    # created_at ranges rather than date(created_at) IN (...), so the created_at index is used
+    if days is None:
+        return true()
+    starts = [datetime.combine(day, time.min) for day in days]
+    return or_(*[and_(Service_tickets.created_at >= start, Service_tickets.created_at < start + timedelta(days=1)) for start in starts])
+
+
+def pending_days(connection):
+    # Taken off the queue in the same transaction as the rebuild: a failed refresh leaves them queued,
+    # days queued by transactions that commit later stay for the next refresh
+    return sorted(set(connection.execute(delete(report_pending_days).returning(report_pending_days.c.day)).scalars()))
+
+
+def write_rollups(connection, days=None):
+    # Rebuild the rollups of `days` (every day by default) with one INSERT ... SELECT per rollup table.
+    # Works on the session or on a bare connection (migrations), the caller commits
+    if days is not None and not days:
+        return
+    for table in ROLLUPS:
+        connection.execute(delete(table).where(true() if days is None else table.c.day.in_(days)))
+    in_days = days_filter(days)
+    parts = parts_totals(in_days)
+    tickets = (
+        select(
+            Service_tickets.id,
+            Service_tickets.customer_id,
+            day_of(Service_tickets.created_at).label("day"),
+            Service_tickets.price.label("labor"),
+            func.coalesce(parts.c.parts_price, 0.0).label("parts")
+        )
+        .outerjoin(parts, parts.c.ticket_id == Service_tickets.id)
+        .where(in_days)
+        .subquery()
+    )
+    connection.execute(insert(report_daily).from_select(
+        ["day", "tickets", "labor", "parts"],
+        select(tickets.c.day, func.count(), func.sum(tickets.c.labor), func.sum(tickets.c.parts)).group_by(tickets.c.day)
+    ))
+    connection.execute(insert(report_customer_daily).from_select(
+        ["day", "customer_id", "tickets", "revenue"],
+        select(tickets.c.day, tickets.c.customer_id, func.count(), func.sum(tickets.c.labor + tickets.c.parts))
+        .group_by(tickets.c.day, tickets.c.customer_id)
+    ))
+    # The labor of a ticket is shared equally between its mechanics
+    crew_sizes = (
+        select(ticket_mechanics.c.service_ticket_id, func.count().label("crew_size"))
+        .group_by(ticket_mechanics.c.service_ticket_id)
+        .subquery()
+    )
+    connection.execute(insert(report_mechanic_daily).from_select(
+        ["day", "mechanic_id", "tickets", "revenue"],
+        select(tickets.c.day, ticket_mechanics.c.mechanic_id, func.count(), func.sum(tickets.c.labor / crew_sizes.c.crew_size))
+        .join(ticket_mechanics, ticket_mechanics.c.service_ticket_id == tickets.c.id)
+        .join(crew_sizes, crew_sizes.c.service_ticket_id == tickets.c.id)
+        .group_by(tickets.c.day, ticket_mechanics.c.mechanic_id)
+    ))
+    parts_day = day_of(Service_tickets.created_at)
+    connection.execute(insert(report_parts_daily).from_select(
+        ["day", "made_in", "parts", "revenue"],
+        select(parts_day, PartDescriptions.made_in, func.count(Parts.id), func.sum(PartDescriptions.price))
+        .select_from(Parts)
+        .join(Parts.service_ticket)
+        .join(Parts.part_description)
+        .where(in_days)
+        .group_by(parts_day, PartDescriptions.made_in)
+    ))
+
+
+def refresh_reports(connection, full=False):
+    # Rebuild the queued days and record the refresh, the caller commits. Every day is rebuilt
+    # with `full` or on the first run. Returns the number of days rebuilt
+    started = utcnow()
+    first_run = connection.execute(select(report_watermark.c.name).where(report_watermark.c.name == WATERMARK_NAME)).first() is None
+    if full or first_run:
+        connection.execute(delete(report_pending_days))
+        write_rollups(connection)
+        refreshed = connection.execute(select(func.count()).select_from(report_daily)).scalar()
+    else:
+        days = pending_days(connection)
+        write_rollups(connection, days)
+        refreshed = len(days)
+    connection.execute(delete(report_watermark).where(report_watermark.c.name == WATERMARK_NAME))
+    connection.execute(insert(report_watermark).values(name=WATERMARK_NAME, watermark=started, refreshed_at=started))
+    return refreshed
+
+
+def last_refresh():
+    return db.session.execute(select(report_watermark.c.refreshed_at).where(report_watermark.c.name == WATERMARK_NAME)).scalar()
@@ -0,0 +1,182 @@
+from flask import current_app
+from sqlalchemy import select, insert, delete, event, func, case, inspect, literal, union_all, true
+from app.models import db, Customers, PartDescriptions, search_trigrams
+
+# entity name -> (model, searchable column)
+SEARCHABLE = {
+    "customers" : (Customers, "email"),
+    "part_descriptions" : (PartDescriptions, "name"),
+}
+INDEX_BATCH_SIZE = 1000
+SELECTIVE_TRIGRAMS = 3
+FREQUENCY_CAP = 1000
+
+
+def trigrams(text):
+    text = (text or "").lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def trigram_rows(entity, entity_id, text):
+    return [{"entity" : entity, "trigram" : trigram, "entity_id" : entity_id} for trigram in trigrams(text)]
+
+
+def register_search_index(entity, model, column_name):
+    # Keep search_trigrams in sync with every ORM insert / update / delete of the model,
+    # inside the same transaction as the change itself
+    def after_insert(mapper, connection, target):
+        rows = trigram_rows(entity, target.id, getattr(target, column_name))
+        if rows:
+            connection.execute(insert(search_trigrams), rows)
+
+    def after_update(mapper, connection, target):
+        if not inspect(target).attrs[column_name].history.has_changes():
+            return
+        after_delete(mapper, connection, target)
+        after_insert(mapper, connection, target)
+
+    def after_delete(mapper, connection, target):
+        connection.execute(delete(search_trigrams).where(search_trigrams.c.entity == entity,
+                                                         search_trigrams.c.entity_id == target.id))
+
+    event.listen(model, "after_insert", after_insert)
+    event.listen(model, "after_update", after_update)
+    event.listen(model, "after_delete", after_delete)
+
+
+for entity, (model, column_name) in SEARCHABLE.items():
+    register_search_index(entity, model, column_name)
+
+ENTITIES_BY_TABLE = {model.__table__.name : entity for entity, (model, column_name) in SEARCHABLE.items()}
+
+
+def reindex(connection, entity, entity_ids):
+    # Rewrite the trigrams of these rows from their current values, rows that are gone only lose theirs
+    model, column_name = SEARCHABLE[entity]
+    table = model.__table__
+    entity_ids = list(entity_ids)
+    for start in range(0, len(entity_ids), INDEX_BATCH_SIZE):
+        batch = entity_ids[start:start + INDEX_BATCH_SIZE]
+        connection.execute(delete(search_trigrams).where(search_trigrams.c.entity == entity, search_trigrams.c.entity_id.in_(batch)))
+        rows = []
+        for entity_id, text in connection.execute(select(table.c.id, table.c[column_name]).where(table.c.id.in_(batch))):
+            rows.extend(trigram_rows(entity, entity_id, text))
+        if rows:
+            connection.execute(insert(search_trigrams), rows)
+
+
+def sync_bulk_statement(orm_execute_state):
+    # Bulk insert() / update() / delete() statements skip the mapper events above: find the rows they touch,
+    # run them, then reindex those rows in the same transaction
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return None
+    statement = orm_execute_state.statement
+    entity = ENTITIES_BY_TABLE.get(getattr(getattr(statement, "table", None), "name", None))
+    if entity is None:
+        return None
+    model, column_name = SEARCHABLE[entity]
+    table = model.__table__
+    parameters = orm_execute_state.parameters or []
+    rows = [parameters] if isinstance(parameters, dict) else list(parameters)
+    if orm_execute_state.is_update:
+        values = {getattr(key, "key", key) for key in (getattr(statement, "_values", None) or {})}
+        if column_name not in values and not any(column_name in row for row in rows):
+            return None
+    connection = orm_execute_state.session.connection()
+    highest_id = None
+    if rows and all("id" in row for row in rows):
+        entity_ids = [row["id"] for row in rows]
+    elif orm_execute_state.is_insert:
+        # New ids are above the highest one so far
+        highest_id = connection.execute(select(func.max(table.c.id))).scalar() or 0
+    else:
+        entity_ids = connection.execute(select(table.c.id).where(statement.whereclause if statement.whereclause is not None else true())).scalars().all()
+    result = orm_execute_state.invoke_statement()
+    if highest_id is not None:
+        entity_ids = connection.execute(select(table.c.id).where(table.c.id > highest_id)).scalars().all()
+    reindex(connection, entity, entity_ids)
+    return result
+
+
+def register_search_sync():
+    if not event.contains(db.session, "do_orm_execute", sync_bulk_statement):
+        event.listen(db.session, "do_orm_execute", sync_bulk_statement)
+
+
+def selective_trigrams(entity, term_trigrams):
+    # Intersecting the postings of the rarest few trigrams is enough to narrow the candidates,
+    # common ones (like "com" in emails) only make the intersection slower.
+    # Returns None for terms too short to have trigrams and [] when a trigram matches no row at all.
+    if not term_trigrams:
+        return None
+    # Postings are only counted up to FREQUENCY_CAP so very common trigrams stay cheap to rank
+    frequency_queries = [
+        select(literal(trigram), func.count()).select_from(
+            select(search_trigrams.c.entity_id)
+            .where(search_trigrams.c.entity == entity, search_trigrams.c.trigram == trigram)
+            .limit(FREQUENCY_CAP)
+            .subquery()
+        )
+        for trigram in term_trigrams
+    ]
+    frequencies = dict(db.session.execute(union_all(*frequency_queries)).all())
+    if 0 in frequencies.values():
+        return []
+    return sorted(frequencies, key=frequencies.get)[:SELECTIVE_TRIGRAMS]
+
+
+def search(entity, term, limit=None, offset=0, options=()):
+    model, column_name = SEARCHABLE[entity]
+    column = getattr(model, column_name)
+    max_results = current_app.config.get("MAX_SEARCH_RESULTS", 50)
+    limit = max_results if limit is None else min(limit, max_results)
+    term = term.lower()
+    query = select(model).options(*options).where(column.icontains(term, autoescape=True))
+    term_trigrams = selective_trigrams(entity, trigrams(term))
+    if term_trigrams is None:
+        # Terms shorter than a trigram can't use the index: stop the scan at the first matches instead of ranking
+        return db.session.scalars(query.order_by(model.id).offset(offset).limit(limit)).all()
+    if not term_trigrams:
+        return []
+    # Only rows holding the term's trigrams can contain it: the trigram index narrows the
+    # candidates, then the ILIKE above re-checks them, so results match the plain substring search
+    candidates = (
+        select(search_trigrams.c.entity_id)
+        .where(search_trigrams.c.entity == entity, search_trigrams.c.trigram.in_(term_trigrams))
+        .group_by(search_trigrams.c.entity_id)
+        .having(func.count() == len(term_trigrams))
+    )
+    query = query.where(model.id.in_(candidates))
+    # Exact matches first, then prefix matches, then the shortest values
+    rank = case(
+        (func.lower(column) == term, 0),
+        (func.lower(column).startswith(term, autoescape=True), 1),
+        else_=2
+    )
+    query = query.order_by(rank, func.length(column), model.id).offset(offset).limit(limit)
+    return db.session.scalars(query).all()
+
+
+def write_search_index(connection):
+    # Rebuild every entity's trigrams from scratch, INDEX_BATCH_SIZE rows at a time.
+    # Works on the session or on a bare connection (migrations), the caller commits.
+    indexed = 0
+    connection.execute(delete(search_trigrams))
+    for entity, (model, column_name) in SEARCHABLE.items():
+        table = model.__table__
+        rows = []
+        for entity_id, text in connection.execute(select(table.c.id, table.c[column_name]).execution_options(yield_per=INDEX_BATCH_SIZE)):
+            rows.extend(trigram_rows(entity, entity_id, text))
+            indexed += 1
+            if len(rows) >= INDEX_BATCH_SIZE:
+                connection.execute(insert(search_trigrams), rows)
+                rows = []
+        if rows:
+            connection.execute(insert(search_trigrams), rows)
+    return indexed
+
+
+def rebuild_search_index():
+    indexed = write_search_index(db.session)
+    db.session.commit()
+    return indexed
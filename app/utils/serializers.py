@@ -0,0 +1,76 @@
+from marshmallow import Schema, fields
+from marshmallow.utils import ensure_text_type
+from app.extensions import ma
+
+# Plain column fields and how to turn a non-None attribute into the value marshmallow would dump.
+# Exact classes only, a subclass may serialize differently.
+CONVERTERS = {
+    fields.Integer : "int",
+    fields.Float : "float",
+    fields.String : "text",
+    fields.DateTime : "isoformat",
+}
+
+
+def has_dump_hooks(schema):
+    # marshmallow keeps its decorated hooks in the private _hooks: if that ever changes, assume there are some
+    hooks = getattr(schema, "_hooks", None)
+    if not isinstance(hooks, dict):
+        return True
+    return any(registered for tag, registered in hooks.items() if "dump" in str(tag))
+
+
+def compile_serializer(schema):
+    # Function obj -> dict building the dict in one expression, or None when `schema` needs marshmallow's generic
+    # path. Covers what the auto-schemas here use: plain fields, no dump hooks, no custom attribute access
+    try:
+        return build_serializer(schema)
+    except Exception:
+        return None
+
+
+def build_serializer(schema):
+    if has_dump_hooks(schema):
+        return None
+    if type(schema).get_attribute is not Schema.get_attribute or type(schema)._serialize is not Schema._serialize:
+        return None
+    items = []
+    for name, field in schema.dump_fields.items():
+        converter = CONVERTERS.get(type(field))
+        attribute = field.attribute or name
+        key = field.data_key if field.data_key is not None else name
+        if converter is None or getattr(field, "as_string", False) or not attribute.isidentifier():
+            return None
+        value = f"obj.{attribute}"
+        if converter == "isoformat":
+            # Only the default ISO format, the others go through marshmallow's formatting functions
+            if field.format not in (None, "iso", "iso8601"):
+                return None
+            expression = f"(v if (v := {value}) is None else v.isoformat())"
+        elif converter == "text":
+            expression = f"(v if (v := {value}) is None or v.__class__ is str else text(v))"
+        else:
+            expression = f"(v if (v := {value}) is None else {converter}(v))"
+        items.append(f"{key!r} : {expression}")
+    source = "def serialize(obj):\n    return {" + ", ".join(items) + "}\n"
+    namespace = {"text" : ensure_text_type}
+    exec(compile(source, f"<serializer {type(schema).__name__}>", "exec"), namespace)
+    return namespace["serialize"]
+
+
+# Auto-schema whose dump (and so jsonify) runs a serializer compiled on first use, with marshmallow's output.
+# Schemas the compiler can't handle keep the generic path.
+class CompiledSchema(ma.SQLAlchemyAutoSchema):
+    _serializer = None
+    _compiled = False
+
+    def dump(self, obj, *, many=None):
+        if not self._compiled:
+            self._serializer = compile_serializer(self)
+            self._compiled = True
+        if self._serializer is None or obj is None:
+            return super().dump(obj, many=many)
+        many = self.many if many is None else bool(many)
+        if many:
+            return list(map(self._serializer, obj))
+        return self._serializer(obj)
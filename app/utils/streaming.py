@@ -0,0 +1,40 @@
+from flask import request, current_app, Response, stream_with_context
+from app.models import db
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def wants_stream():
+    # ?stream=true asks for a chunked JSON array, Accept: application/x-ndjson for one JSON document per line
+    stream = request.args.get('stream', default=False, type=lambda value: value.lower() == "true")
+    return stream or wants_ndjson()
+
+
+def stream_query(query, serialize):
+    # Rows are fetched STREAM_BATCH_SIZE at a time and serialized one by one,
+    # so memory stays flat no matter how big the table is
+    dumps = current_app.json.dumps
+
+    def rows():
+        return db.session.scalars(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+
+    def generate_ndjson():
+        for row in rows():
+            yield dumps(serialize(row)) + "\n"
+
+    def generate_json_array():
+        yield "["
+        separator = ""
+        for row in rows():
+            yield separator + dumps(serialize(row))
+            separator = ","
+        yield "]"
+
+    if wants_ndjson():
+        return Response(stream_with_context(generate_ndjson()), mimetype=NDJSON_MIMETYPE)
+    return Response(stream_with_context(generate_json_array()), mimetype="application/json")
@@ -0,0 +1,57 @@
+from sqlalchemy import select, func
+from app.models import db, Service_tickets, Parts, PartDescriptions
+
+
+def parts_totals(ticket_filter):
+    # Number and price of the parts of every ticket matched by ticket_filter, aggregated in the database
+    return (
+        select(Parts.ticket_id, func.count(Parts.id).label("parts_count"), func.sum(PartDescriptions.price).label("parts_price"))
+        .join(Parts.part_description)
+        .join(Parts.service_ticket)
+        .where(ticket_filter)
+        .group_by(Parts.ticket_id)
+        .subquery()
+    )
+
+
+def total_format(labor, parts_price, parts_count):
+    return {
+        "labor" : round(labor or 0.0, 2),
+        "parts" : round(parts_price or 0.0, 2),
+        "parts_count" : parts_count or 0,
+        "total" : round((labor or 0.0) + (parts_price or 0.0), 2)
+    }
+
+
+def ticket_totals(service_ticket_ids):
+    # Labor (the ticket price), parts and total of each service ticket with one aggregate query,
+    # as {service_ticket_id : totals}. Tickets that don't exist are left out
+    if not service_ticket_ids:
+        return {}
+    parts = parts_totals(Service_tickets.id.in_(service_ticket_ids))
+    query = (
+        select(Service_tickets.id, Service_tickets.price, parts.c.parts_price, parts.c.parts_count)
+        .outerjoin(parts, parts.c.ticket_id == Service_tickets.id)
+        .where(Service_tickets.id.in_(service_ticket_ids))
+    )
+    return {
+        ticket_id : {"service_ticket_id" : ticket_id, **total_format(labor, parts_price, parts_count)}
+        for ticket_id, labor, parts_price, parts_count in db.session.execute(query)
+    }
+
+
+def customer_totals(customer_id):
+    # Sum of every service ticket of the customer, the per-ticket aggregate is rolled up in the same query
+    parts = parts_totals(Service_tickets.customer_id == customer_id)
+    query = (
+        select(
+            func.count(Service_tickets.id),
+            func.sum(Service_tickets.price),
+            func.sum(parts.c.parts_price),
+            func.sum(parts.c.parts_count)
+        )
+        .outerjoin(parts, parts.c.ticket_id == Service_tickets.id)
+        .where(Service_tickets.customer_id == customer_id)
+    )
+    tickets_count, labor, parts_price, parts_count = db.session.execute(query).one()
+    return {"customer_id" : customer_id, "tickets_count" : tickets_count, **total_format(labor, parts_price, parts_count)}
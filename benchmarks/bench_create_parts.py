@@ -0,0 +1,41 @@
+# Benchmark for POST /parts?qty=<n> with a shared base serial number
+# Run from the project root: python -m benchmarks.bench_create_parts
+import time
+from sqlalchemy import event, insert
+from app import create_app
+from app.models import db, Parts, PartDescriptions
+
+
+def seed(taken_suffixes):
+    db.drop_all()
+    db.create_all()
+    db.session.add(PartDescriptions(name="Brake pad", price=50.0, made_in="USA"))
+    db.session.commit()
+    # Half of the first suffixes are already taken to exercise the skipping logic
+    rows = [{"desc_id" : 1, "serial_number" : "BP"}]
+    rows += [{"desc_id" : 1, "serial_number" : f"BP-{suffix}"} for suffix in range(1, taken_suffixes + 1, 2)]
+    db.session.execute(insert(Parts), rows)
+    db.session.commit()
+
+
+def main():
+    app = create_app('BenchmarkConfig')
+    client = app.test_client()
+    print(f"{'qty':>7} {'seconds':>8} {'queries':>8}")
+    for quantity in [1, 100, 10_000]:
+        with app.app_context():
+            seed(taken_suffixes=quantity)
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, "before_cursor_execute", listener)
+            start = time.perf_counter()
+            response = client.post(f'/parts?qty={quantity}', json={"desc_id" : 1, "serial_number" : "BP"})
+            elapsed = time.perf_counter() - start
+            event.remove(db.engine, "before_cursor_execute", listener)
+            assert response.status_code == 200
+            assert len(response.get_json()["part_ids"]) == quantity
+            print(f"{quantity:>7} {elapsed:>8.3f} {len(statements):>8}")
+
+
+if __name__ == '__main__':
+    main()
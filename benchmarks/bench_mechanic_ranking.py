@@ -0,0 +1,57 @@
+# Benchmark for /mechanics/sort_by_work and /mechanics/hard_work_mechanic
+# Run from the project root: python -m benchmarks.bench_mechanic_ranking
+import random
+import time
+from sqlalchemy import event, insert
+from app import create_app
+from app.models import db, Customers, Mechanics, Service_tickets, ticket_mechanics
+from app.utils.ranking import rebuild_ticket_counts
+
+
+def seed(mechanics_count, tickets_count, assignments_per_ticket=3):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(Customers), [{"first_name" : "C", "last_name" : "C", "email" : "c@email.com", "password" : "x", "phone" : "+1"}])
+    db.session.execute(insert(Mechanics), [
+        {"first_name" : f"M{i}", "last_name" : "M", "email" : f"m{i}@email.com", "password" : "x", "phone" : "+1", "salary" : 1.0}
+        for i in range(mechanics_count)
+    ])
+    db.session.execute(insert(Service_tickets), [
+        {"customer_id" : 1, "service_desc" : "desc", "price" : 10.0, "VIN" : f"VIN{i}"}
+        for i in range(tickets_count)
+    ])
+    rows = []
+    for ticket_id in range(1, tickets_count + 1):
+        for mechanic_id in random.sample(range(1, mechanics_count + 1), assignments_per_ticket):
+            rows.append({"service_ticket_id" : ticket_id, "mechanic_id" : mechanic_id})
+    db.session.execute(insert(ticket_mechanics), rows)
+    db.session.commit()
+    rebuild_ticket_counts()
+
+
+def measure(client, url):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    start = time.perf_counter()
+    response = client.get(url)
+    elapsed = time.perf_counter() - start
+    event.remove(db.engine, "before_cursor_execute", listener)
+    assert response.status_code == 200
+    return elapsed, len(statements)
+
+
+def main():
+    app = create_app('BenchmarkConfig')
+    client = app.test_client()
+    print(f"{'mechanics':>10} {'tickets':>8} {'endpoint':<40} {'seconds':>8} {'queries':>8}")
+    for mechanics_count, tickets_count in [(100, 1_000), (1_000, 10_000), (5_000, 100_000)]:
+        with app.app_context():
+            seed(mechanics_count, tickets_count)
+            for url in ['/mechanics/hard_work_mechanic', '/mechanics/sort_by_work', '/mechanics/sort_by_work?limit=10']:
+                elapsed, queries = measure(client, url)
+                print(f"{mechanics_count:>10} {tickets_count:>8} {url:<40} {elapsed:>8.3f} {queries:>8}")
+
+
+if __name__ == '__main__':
+    main()
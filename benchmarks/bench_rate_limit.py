@@ -0,0 +1,57 @@
+# Benchmark for the per-request overhead of Flask-Limiter with each storage / strategy
+# Run from the project root: python -m benchmarks.bench_rate_limit [requests]
+import os
+import sys
+import tempfile
+import time
+from flask import Flask
+from flask_limiter import Limiter
+from app.utils.auth import encode_token
+from app.utils.rate_limit import rate_limit_key
+
+
+def make_app(storage_uri=None, strategy="fixed-window"):
+    app = Flask(__name__)
+    app.config["RATELIMIT_ENABLED"] = storage_uri is not None
+    app.config["RATELIMIT_STORAGE_URI"] = storage_uri or "memory://"
+    app.config["RATELIMIT_STRATEGY"] = strategy
+    # Same shape as the app: two default limits plus one on the route, all high enough to never trip
+    limiter = Limiter(key_func=rate_limit_key, app=app, default_limits=["1000000 per day", "1000000 per hour"])
+
+    @app.route('/ping')
+    @limiter.limit("1000000 per minute")
+    def ping():
+        return "pong"
+
+    # Flask only keeps a weak reference to the extension
+    app.limiter = limiter
+    return app
+
+
+def measure(app, requests, headers=None):
+    client = app.test_client()
+    client.get('/ping', headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/ping', headers=headers)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    return elapsed / requests * 1_000_000
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    path = os.path.join(tempfile.mkdtemp(), "bench_ratelimit.db")
+    headers = {"Authorization" : "Bearer " + encode_token(1, "customer")}
+    baseline = measure(make_app(), requests)
+    print(f"{'storage':<10} {'strategy':<14} {'key':<8} {'us/request':>11} {'overhead':>9}")
+    print(f"{'disabled':<10} {'-':<14} {'-':<8} {baseline:>11.1f} {0:>9.1f}")
+    for name, uri in [("memory", "memory://"), ("sqlite", f"sqlite:///{path}")]:
+        for strategy in ["fixed-window", "moving-window"]:
+            for key, request_headers in [("address", None), ("user", headers)]:
+                per_request = measure(make_app(uri, strategy), requests, request_headers)
+                print(f"{name:<10} {strategy:<14} {key:<8} {per_request:>11.1f} {per_request - baseline:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
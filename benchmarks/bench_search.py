@@ -0,0 +1,53 @@
+# Benchmark trigram search vs the old ILIKE '%term%' scan for /customers/search_by_email
+# Run from the project root: python -m benchmarks.bench_search [customers]   (default 1,000,000)
+import random
+import string
+import sys
+import time
+from sqlalchemy import insert
+from app import create_app
+from app.models import db, Customers
+from app.utils.search import search, rebuild_search_index
+
+BATCH_SIZE = 50_000
+
+
+def seed(customers_count):
+    db.drop_all()
+    db.create_all()
+    domains = ["gmail.com", "yahoo.com", "outlook.com", "shop.example"]
+    for start in range(0, customers_count, BATCH_SIZE):
+        rows = []
+        for i in range(start, min(start + BATCH_SIZE, customers_count)):
+            name = "".join(random.choices(string.ascii_lowercase, k=8))
+            rows.append({"first_name" : "F", "last_name" : "L", "email" : f"{name}{i}@{random.choice(domains)}",
+                         "password" : "x", "phone" : "+1"})
+        db.session.execute(insert(Customers), rows)
+    db.session.commit()
+
+
+def timed(function, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, len(result)
+
+
+def main():
+    customers_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    app = create_app('BenchmarkConfig')
+    with app.app_context():
+        seed(customers_count)
+        start = time.perf_counter()
+        rebuild_search_index()
+        print(f"indexed {customers_count} customers in {time.perf_counter() - start:.1f}s")
+        sample_email = db.session.get(Customers, customers_count // 2).email
+        print(f"{'term':<20} {'ilike s':>9} {'trigram s':>10} {'results':>8}")
+        for term in [sample_email[:6], sample_email.split("@")[0], sample_email, "zz"]:
+            ilike_seconds, _ = timed(lambda: db.session.query(Customers).where(Customers.email.ilike(f"%{term}%")).limit(50).all())
+            trigram_seconds, results = timed(lambda: search("customers", term))
+            print(f"{term:<20} {ilike_seconds:>9.4f} {trigram_seconds:>10.4f} {results:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# Benchmark for schema dump throughput, marshmallow's generic path against the compiled serializers
+# Run from the project root: python -m benchmarks.bench_serializers
+import time
+from marshmallow import Schema
+from app import create_app
+from app.models import Customers, Mechanics, Parts, PartDescriptions, Service_tickets
+
+
+def rows(model, count):
+    makers = {
+        Customers : lambda i: Customers(id=i, first_name=f"First{i}", last_name="Last", email=f"c{i}@email.com", password="x" * 100, phone="+1", address="Street"),
+        Mechanics : lambda i: Mechanics(id=i, first_name=f"First{i}", last_name="Last", email=f"m{i}@email.com", password="x" * 100, phone="+1", salary=1000.0, ticket_count=i % 10),
+        Service_tickets : lambda i: Service_tickets(id=i, customer_id=1, service_desc="desc", price=10.0, VIN=f"VIN{i}"),
+        Parts : lambda i: Parts(id=i, ticket_id=i, desc_id=1, serial_number=f"SN{i}"),
+        PartDescriptions : lambda i: PartDescriptions(id=i, name=f"Part{i}", price=5.0, made_in="USA"),
+    }
+    return [makers[model](i) for i in range(count)]
+
+
+def measure(dump, objects):
+    start = time.perf_counter()
+    dump(objects)
+    return time.perf_counter() - start
+
+
+def main():
+    create_app('BenchmarkConfig')
+    from app.blueprints.customers.schemas import customers_schema
+    from app.blueprints.mechanics.schemas import mechanics_schema
+    from app.blueprints.service_tickets.schemas import service_tickets_schema
+    from app.blueprints.parts.schemas import parts_schema
+    from app.blueprints.part_descriptions.schemas import part_descriptions_schema
+    schemas = [(Customers, customers_schema), (Mechanics, mechanics_schema), (Service_tickets, service_tickets_schema),
+               (Parts, parts_schema), (PartDescriptions, part_descriptions_schema)]
+    print(f"{'schema':<24} {'rows':>7} {'marshmallow rows/s':>19} {'compiled rows/s':>16} {'speedup':>8}")
+    for count in [10_000, 100_000]:
+        for model, schema in schemas:
+            objects = rows(model, count)
+            assert schema.dump(objects[:10]) == Schema.dump(schema, objects[:10])
+            generic = measure(lambda objects: Schema.dump(schema, objects), objects)
+            compiled = measure(schema.dump, objects)
+            print(f"{type(schema).__name__:<24} {count:>7} {count / generic:>19,.0f} {count / compiled:>16,.0f} {generic / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Benchmark for mixed read/write traffic from several processes on one SQLite file,
+# with the default journal and with the ProductionConfig SQLITE_PRAGMAS (WAL, busy_timeout, ...)
+# Run from the project root: python -m benchmarks.bench_sqlite_concurrency [workers] [seconds]
+import multiprocessing
+import random
+import sys
+import time
+from sqlalchemy import insert, text
+from sqlalchemy.exc import OperationalError
+from config import ProductionConfig
+from app import create_app
+from app.models import db, Customers, Mechanics
+from app.utils.auth import encode_token
+from app.utils.engine import register_sqlite_pragmas
+
+WRITE_RATIO = 0.2
+
+
+def make_app(tuned):
+    app = create_app('BenchmarkConfig')
+    # Let "database is locked" reach the worker instead of becoming a logged 500
+    app.config["PROPAGATE_EXCEPTIONS"] = True
+    if tuned:
+        register_sqlite_pragmas(app, ProductionConfig.SQLITE_PRAGMAS)
+    return app
+
+
+def seed(tuned, workers):
+    app = make_app(tuned)
+    with app.app_context():
+        db.drop_all()
+        with db.engine.connect() as connection:
+            # journal_mode is stored in the file, switch back explicitly for the untuned run
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL" if tuned else "PRAGMA journal_mode=DELETE")
+        db.create_all()
+        db.session.execute(insert(Customers), [
+            {"first_name" : f"C{i}", "last_name" : "C", "email" : f"c{i}@email.com", "password" : "x", "phone" : "+1"}
+            for i in range(workers)
+        ])
+        db.session.execute(insert(Mechanics), [
+            {"first_name" : f"M{i}", "last_name" : "M", "email" : f"m{i}@email.com", "password" : "x", "phone" : "+1", "salary" : 1.0}
+            for i in range(100)
+        ])
+        db.session.commit()
+        journal_mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+        db.engine.dispose()
+    return journal_mode
+
+
+def worker(tuned, customer_id, seconds, results):
+    app = make_app(tuned)
+    client = app.test_client()
+    headers = {"Authorization" : "Bearer " + encode_token(customer_id, "customer")}
+    reads = writes = locked = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if random.random() < WRITE_RATIO:
+                response = client.post('/service_tickets', json={"service_desc" : "desc", "price" : 10.0, "VIN" : "VIN"}, headers=headers)
+                writes += 1
+            else:
+                response = client.get(random.choice(['/customers/profile', '/mechanics/sort_by_work?limit=10']), headers=headers)
+                reads += 1
+            assert response.status_code in (200, 201), response.status_code
+        except OperationalError:
+            locked += 1
+        latencies.append(time.perf_counter() - start)
+    results.put((reads, writes, locked, latencies))
+
+
+def run(tuned, workers, seconds):
+    journal_mode = seed(tuned, workers)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(tuned, customer_id, seconds, results)) for customer_id in range(1, workers + 1)]
+    for process in processes:
+        process.start()
+    reads = writes = locked = 0
+    latencies = []
+    for _ in processes:
+        worker_reads, worker_writes, worker_locked, worker_latencies = results.get()
+        reads, writes, locked = reads + worker_reads, writes + worker_writes, locked + worker_locked
+        latencies += worker_latencies
+    for process in processes:
+        process.join()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    print(f"{'tuned' if tuned else 'default':<8} {journal_mode:<8} {workers:>7} {(reads + writes) / seconds:>9.0f} {reads:>7} {writes:>7} {locked:>7} {p99:>8.1f}")
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"{'profile':<8} {'journal':<8} {'workers':>7} {'req/s':>9} {'reads':>7} {'writes':>7} {'locked':>7} {'p99 ms':>8}")
+    for tuned in [False, True]:
+        run(tuned, workers, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Benchmark for worker cold start: import time, create_app('ProductionConfig') and the first requests,
+# each measured in a fresh interpreter, with and without the Swagger UI, plus an import-time breakdown
+# Run from the project root: python -m benchmarks.bench_startup [runs]
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+DATABASE = os.path.join(tempfile.mkdtemp(), "bench_startup.db")
+ENVIRONMENT = {
+    **os.environ,
+    "SQLALCHEMY_DATABASE_URI" : f"sqlite:///{DATABASE}",
+    "CACHE_TYPE" : "SimpleCache",
+    "RATELIMIT_STORAGE_URI" : "memory://",
+}
+
+STARTUP = """
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app('ProductionConfig')
+created = time.perf_counter()
+client = app.test_client()
+assert client.get('/part_descriptions').status_code == 200
+first = time.perf_counter()
+assert client.get('/mechanics/sort_by_work').status_code == 200
+second = time.perf_counter()
+print(json.dumps({"import" : imported - start, "create_app" : created - imported, "first request" : first - created, "second request" : second - first}))
+"""
+
+
+def prepare_database():
+    subprocess.run([sys.executable, "-m", "flask", "--app", "flask_app", "db-upgrade"], env=ENVIRONMENT, check=True, capture_output=True)
+
+
+def measure(swagger, runs):
+    environment = {**ENVIRONMENT, "SWAGGER_UI_ENABLED" : "true" if swagger else "false"}
+    timings = defaultdict(list)
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", STARTUP], env=environment, check=True, capture_output=True, text=True).stdout
+        for phase, seconds in json.loads(output).items():
+            timings[phase].append(seconds)
+    return {phase : statistics.median(values) for phase, values in timings.items()}
+
+
+def import_breakdown(top=12):
+    # -X importtime self times summed per top-level package, for everything create_app imports
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from app import create_app; create_app('ProductionConfig')"],
+        env=ENVIRONMENT, check=True, capture_output=True, text=True
+    ).stderr
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        self_us, _, name = line.split("|")
+        packages[name.strip().split(".")[0]] += int(self_us.split(":")[1])
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    prepare_database()
+    print(f"{'swagger ui':<11} {'import':>8} {'create_app':>11} {'1st request':>12} {'2nd request':>12}   (ms, median of {runs})")
+    for swagger in [True, False]:
+        timings = measure(swagger, runs)
+        print(f"{'on' if swagger else 'off':<11} {timings['import'] * 1000:>8.1f} {timings['create_app'] * 1000:>11.1f} "
+              f"{timings['first request'] * 1000:>12.1f} {timings['second request'] * 1000:>12.1f}")
+    print(f"\n{'package':<24} {'import ms':>10}")
+    for package, microseconds in import_breakdown():
+        print(f"{package:<24} {microseconds / 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
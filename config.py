@@ -1,9 +1,15 @@
 import os
+import tempfile
 class DevelopmentConfig:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///mechanic_app.db'
     DEBUG = True
     CACHE_TYPE = "SimpleCache"
     CACHE_DEFAULT_TIMEOUT = 200
+    MAX_PAGE_SIZE = 100
+    MAX_SEARCH_RESULTS = 50
+    TOKEN_CACHE_SIZE = 1024
+    PASSWORD_HASH_METHOD = "scrypt"
+    RATELIMIT_STORAGE_URI = "memory://"
     
 
 class TestingConfig:
@@ -12,8 +18,69 @@ class TestingConfig:
     CACHE_TYPE = "SimpleCache"
     CACHE_DEFAULT_TIMEOUT = 300
     TESTING = True
+    MAX_PAGE_SIZE = 100
+    MAX_SEARCH_RESULTS = 50
+    TOKEN_CACHE_SIZE = 1024
+    # Cheap hashes keep the test suite fast
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    # Same referential checks as production
+    SQLITE_PRAGMAS = {"foreign_keys" : "ON"}
+    RATELIMIT_STORAGE_URI = "memory://"
 
 
 class ProductionConfig:
     SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI') or 'sqlite:///mechanic_app.db'
-    CACHE_TYPE = "SimpleCache"
\ No newline at end of file
+    # Connection pool, one per gunicorn worker (see app/utils/engine.py). The pool holds one connection per
+    # worker thread unless DB_POOL_SIZE is set; DB_MAX_CONNECTIONS caps the total over WEB_CONCURRENCY workers
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 1))
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 0))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 2))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 10))
+    # PostgreSQL cancels statements running longer than this, 0 disables it
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    # Run on every new SQLite connection, ignored for other databases. WAL lets workers read while one writes,
+    # busy_timeout (first, so switching to WAL waits too) makes writers queue for the lock instead of failing
+    # with "database is locked", synchronous=NORMAL is durable in WAL mode but skips the fsync per commit
+    SQLITE_PRAGMAS = {
+        "busy_timeout" : int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 15000)),
+        "journal_mode" : "WAL",
+        "synchronous" : "NORMAL",
+        "foreign_keys" : "ON",
+        "cache_size" : -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536)),
+        "mmap_size" : int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),
+        "temp_store" : "MEMORY"
+    }
+    # The cache has to be shared by every gunicorn worker so invalidations are seen everywhere:
+    # FileSystemCache for a single host, or CACHE_TYPE=RedisCache with CACHE_REDIS_URL
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or "FileSystemCache"
+    CACHE_DIR = os.environ.get('CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'mechanic_app_cache')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    # Writes through db.session invalidate cached views, the timeout bounds how long any other write goes unseen
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 100))
+    MAX_SEARCH_RESULTS = int(os.environ.get('MAX_SEARCH_RESULTS', 50))
+    TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or "scrypt"
+    # Verify login passwords in a bounded pool ("thread" or "process"), 0 verifies in the request thread.
+    # The request still waits for its hash: the pool only caps concurrent hashing, it doesn't free workers
+    PASSWORD_VERIFY_WORKERS = int(os.environ.get('PASSWORD_VERIFY_WORKERS', 0))
+    PASSWORD_VERIFY_EXECUTOR = os.environ.get('PASSWORD_VERIFY_EXECUTOR') or "thread"
+    PASSWORD_VERIFY_TIMEOUT = float(os.environ.get('PASSWORD_VERIFY_TIMEOUT', 5))
+    # Verifications queued or running at once before logins get a 503, 0 is 4 per worker
+    PASSWORD_VERIFY_MAX_PENDING = int(os.environ.get('PASSWORD_VERIFY_MAX_PENDING', 0))
+    # The Swagger UI blueprint is skipped in production unless asked for, it only adds startup time
+    SWAGGER_UI_ENABLED = os.environ.get('SWAGGER_UI_ENABLED', 'false').lower() == 'true'
+    # Rate limits have to be counted across workers: a SQLite file shared on one host, or redis://... across hosts
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI') or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'mechanic_app_ratelimit.db')}"
+    # "fixed-window" is one counter per key, "moving-window" can't be burst at window boundaries but stores every hit
+    RATELIMIT_STRATEGY = os.environ.get('RATELIMIT_STRATEGY') or "fixed-window"
+
+class BenchmarkConfig:
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///benchmark_mechanic_app.db'
+    CACHE_TYPE = "SimpleCache"
+    RATELIMIT_STORAGE_URI = "memory://"
+    RATELIMIT_ENABLED = False
@@ -1,14 +1,9 @@
 from app import create_app
-from app.models import db
 
 
 # app = create_app('DevelopmentConfig')
+# No DDL or schema reflection here, every gunicorn worker imports this module.
+# The schema is migrated once before the workers start (gunicorn.conf.py) or with `flask db-upgrade`.
 app = create_app('ProductionConfig')
 
-with app.app_context():
-    # db.drop_all()
-    db.create_all()
-
 # app.run()
-
-
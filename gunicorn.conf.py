@@ -0,0 +1,21 @@
+# gunicorn -c gunicorn.conf.py flask_app:app
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+# WEB_CONCURRENCY / WEB_THREADS also size the database pool (see config.ProductionConfig)
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('WEB_THREADS', 1))
+
+
+def on_starting(server):
+    # Runs once in the master before any worker is forked, so workers boot against an up to date schema
+    from app import create_app
+    from app.models import db
+    from app.migrations import upgrade
+
+    app = create_app('ProductionConfig')
+    with app.app_context():
+        for name in upgrade(db.engine):
+            server.log.info("Applied migration %s", name)
+        # Workers must not inherit the master's connections
+        db.engine.dispose()
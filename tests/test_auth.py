@@ -0,0 +1,91 @@
+import time
+import unittest
+from unittest.mock import patch
+from jose import jwt
+from sqlalchemy import event
+from app import create_app
+from app.models import Mechanics, db
+from werkzeug.security import generate_password_hash
+from app.utils.auth import encode_token, token_cache, TokenCache
+
+class TestAuth(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(Mechanics(first_name="FirstTest", last_name="LastTest", email="tester@email.com", password=generate_password_hash('1234'), phone="+19999999", salary=00.00))
+            db.session.commit()
+        token_cache.clear()
+        self.headers = {"Authorization" : "Bearer " + encode_token(1, "mechanic")}
+        self.client = self.app.test_client()
+
+    def test_repeated_token_skips_decode(self):
+        with patch("app.utils.auth.jwt.decode", wraps=jwt.decode) as decode:
+            for _ in range(3):
+                response = self.client.get('/mechanics/profile', headers=self.headers)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(decode.call_count, 1)
+        # The rate limit key and token_required both look the token up on every request
+        stats = token_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (5, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 5 / 6)
+
+    def test_invalid_token_is_not_cached(self):
+        response = self.client.get('/mechanics/profile', headers={"Authorization" : "Bearer 123asdasd"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(token_cache.stats()["size"], 0)
+
+    def test_expired_entry_is_dropped(self):
+        cache = TokenCache(maxsize=2)
+        cache.put("expired", "1", "mechanic", time.time() - 1)
+        self.assertIsNone(cache.get("expired"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_lru_eviction_and_invalidation(self):
+        cache = TokenCache(maxsize=2)
+        exp = time.time() + 60
+        cache.put("a", "1", "mechanic", exp)
+        cache.put("b", "2", "customer", exp)
+        cache.get("a")
+        cache.put("c", "3", "mechanic", exp)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.invalidate_subject(1, "mechanic")
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        cache.invalidate("c")
+        self.assertIsNone(cache.get("c"))
+
+    def test_wrong_role_rejected_before_loading(self):
+        headers = {"Authorization" : "Bearer " + encode_token(1, "customer")}
+        with self.app.app_context():
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                response = self.client.get('/mechanics/service_tickets', headers=headers)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['message'], "customer is not allowed.")
+        self.assertEqual(statements, [])
+
+    def test_principal_loaded_with_tickets_in_fixed_queries(self):
+        with self.app.app_context():
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                response = self.client.get('/mechanics/service_tickets', headers=self.headers)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+        self.assertEqual(response.status_code, 200)
+        # The mechanic and its selectin-loaded tickets
+        self.assertEqual(len(statements), 2)
+
+    def test_missing_principal(self):
+        headers = {"Authorization" : "Bearer " + encode_token(99, "mechanic")}
+        response = self.client.get('/mechanics/profile', headers=headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['error'], "Mechanic with id: 99 not found.")
@@ -1,6 +1,7 @@
 import unittest
 from app import create_app
-from app.models import Customers, db
+from app.models import Customers, Service_tickets, Parts, PartDescriptions, db, search_trigrams
+from sqlalchemy import delete, event, insert, update
 from werkzeug.security import generate_password_hash, check_password_hash
 from app.utils.auth import encode_token
 
@@ -34,7 +35,9 @@ class TestCustomers(unittest.TestCase):
         self.assertIn("customer_data", data)
         self.assertIn("token", data)
         self.assertEqual(data["customer_data"]["email"], customer_payload["email"])
-        self.assertTrue(check_password_hash(data["customer_data"]["password"], customer_payload["password"]))
+        self.assertNotIn("password", data["customer_data"])
+        with self.app.app_context():
+            self.assertTrue(check_password_hash(db.session.get(Customers, data["customer_data"]["id"]).password, customer_payload["password"]))
 
         # Duplicate email
         response_dup = self.client.post("/customers", json=customer_payload)
@@ -85,6 +88,34 @@ class TestCustomers(unittest.TestCase):
         self.assertIsInstance(data, list)
         self.assertEqual(response.json[0]['email'], "tester@email.com")
         self.assertEqual(response.json[0]['first_name'], "FirstTest")
+        self.assertNotIn("password", response.json[0])
+
+    def test_read_customers_fields(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        with self.app.app_context():
+            event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                response = self.client.get("/customers?fields=id,email")
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{"id" : 1, "email" : "tester@email.com"}])
+        # Only the requested columns are selected
+        select_statement = [statement for statement in statements if statement.startswith("SELECT")][0]
+        self.assertNotIn("password", select_statement)
+        self.assertNotIn("address", select_statement)
+        response = self.client.get("/customers?fields=email&limit=1")
+        self.assertEqual(response.json["items"], [{"email" : "tester@email.com"}])
+        response = self.client.get("/customers/search_by_email?email=tester&fields=first_name")
+        self.assertEqual(response.json, [{"first_name" : "FirstTest"}])
+
+    def test_read_customers_invalid_fields(self):
+        response = self.client.get("/customers?fields=id,password")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["error"], "unknown field(s): password")
+        response = self.client.get("/customers/search_by_email?email=tester&fields=")
+        self.assertEqual(response.status_code, 400)
 
     def test_read_customer_profile(self):
         headers = {
@@ -125,6 +156,27 @@ class TestCustomers(unittest.TestCase):
         wrong_role_response = self.client.put("/customers", json=update_payload, headers=wrong_role_headers)
         self.assertEqual(wrong_role_response.status_code, 400)
         self.assertEqual(wrong_role_response.json['message'], "mechanic is not allowed.")
+
+    def test_update_customer_keeps_unchanged_password(self):
+        headers = {"Authorization" : "Bearer " + self.token}
+        with self.app.app_context():
+            password_hash = db.session.get(Customers, 1).password
+        update_payload = {
+            "first_name": "FirstTester",
+            "last_name": "LastTester",
+            "email": "tester@email.com",
+            "phone": "+14082222222",
+            "address": "123 Test St"
+        }
+        # Leaving the password out keeps the stored hash
+        response = self.client.put("/customers", json=update_payload, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Customers, 1).password, password_hash)
+        response = self.client.put("/customers", json={**update_payload, "password" : "5678"}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertTrue(check_password_hash(db.session.get(Customers, 1).password, "5678"))
         
     def test_delete_customer(self):
         headers = {
@@ -149,6 +201,19 @@ class TestCustomers(unittest.TestCase):
         self.assertEqual(invalid_token_response.status_code, 401)
         self.assertEqual(invalid_token_response.json['message'], "invalid token")
 
+    def test_delete_customer_with_parts(self):
+        # foreign_keys is on in TestingConfig, parts used in the customer's tickets have to be released first
+        with self.app.app_context():
+            db.session.add(Service_tickets(customer_id=1, service_desc="desc", price=10.0, VIN="VIN1"))
+            db.session.add(PartDescriptions(name="Brake", price=5.0, made_in="USA"))
+            db.session.add(Parts(ticket_id=1, desc_id=1, serial_number="SN1"))
+            db.session.commit()
+        response = self.client.delete("/customers", headers={"Authorization" : "Bearer " + self.token})
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertIsNone(db.session.get(Parts, 1).ticket_id)
+            self.assertIsNone(db.session.get(Service_tickets, 1))
+
     def test_read_customer_service_tickets(self):
         headers = {
             "Authorization" : "Bearer " + self.token
@@ -162,4 +227,91 @@ class TestCustomers(unittest.TestCase):
         response = self.client.get("/customers/search_by_email?email=test")
         self.assertEqual(response.status_code, 200)
         data = response.get_json()
-        self.assertIsInstance(data, list)
\ No newline at end of file
+        self.assertIsInstance(data, list)
+
+    def test_read_customers_cursor_pagination(self):
+        with self.app.app_context():
+            db.session.add_all([Customers(first_name=f"Customer{i}", last_name="Last", email=f"customer{i}@email.com", password="x", phone="+1") for i in range(4)])
+            db.session.commit()
+        response = self.client.get("/customers?limit=2&count=true")
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([customer["email"] for customer in data["items"]], ["tester@email.com", "customer0@email.com"])
+        self.assertEqual(data["total"], 5)
+        self.assertIsNotNone(data["next_cursor"])
+        response = self.client.get(f"/customers?limit=2&after={data['next_cursor']}")
+        data = response.get_json()
+        self.assertEqual([customer["email"] for customer in data["items"]], ["customer1@email.com", "customer2@email.com"])
+        self.assertNotIn("total", data)
+        response = self.client.get(f"/customers?limit=2&after={data['next_cursor']}")
+        data = response.get_json()
+        self.assertEqual([customer["email"] for customer in data["items"]], ["customer3@email.com"])
+        self.assertIsNone(data["next_cursor"])
+        # Invalid cursor
+        response = self.client.get("/customers?after=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+
+    def test_read_customers_page_out_of_range(self):
+        response = self.client.get("/customers?page=50")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [])
+
+    def test_search_by_email_ranking_and_index_sync(self):
+        with self.app.app_context():
+            db.session.add_all([
+                Customers(first_name="A", last_name="A", email="anna.tester@email.com", password="x", phone="+1"),
+                Customers(first_name="B", last_name="B", email="tester@email.co", password="x", phone="+1"),
+                Customers(first_name="C", last_name="C", email="bob@email.com", password="x", phone="+1"),
+            ])
+            db.session.commit()
+        response = self.client.get("/customers/search_by_email?email=TESTER@")
+        self.assertEqual([customer["email"] for customer in response.json], ["tester@email.co", "tester@email.com", "anna.tester@email.com"])
+        response = self.client.get("/customers/search_by_email?email=tester&limit=1&offset=1")
+        self.assertEqual([customer["email"] for customer in response.json], ["tester@email.com"])
+        # Updating / deleting keeps the index in sync
+        with self.app.app_context():
+            bob = db.session.query(Customers).where(Customers.email == "bob@email.com").first()
+            bob.email = "robert@email.com"
+            db.session.commit()
+        self.assertEqual(self.client.get("/customers/search_by_email?email=bob").json, [])
+        self.assertEqual(len(self.client.get("/customers/search_by_email?email=robert").json), 1)
+        self.client.delete("/customers", headers={"Authorization" : "Bearer " + self.token})
+        response = self.client.get("/customers/search_by_email?email=tester@")
+        self.assertEqual([customer["email"] for customer in response.json], ["tester@email.co", "anna.tester@email.com"])
+
+    def test_bulk_statements_keep_search_index_in_sync(self):
+        def emails(term):
+            return sorted(customer["email"] for customer in self.client.get("/customers/search_by_email?email=" + term).json)
+        with self.app.app_context():
+            db.session.execute(insert(Customers), [
+                {"first_name" : "A", "last_name" : "A", "email" : "bulk.one@email.com", "password" : "x", "phone" : "+1"},
+                {"first_name" : "B", "last_name" : "B", "email" : "bulk.two@email.com", "password" : "x", "phone" : "+1"},
+            ])
+            db.session.commit()
+        self.assertEqual(emails("bulk"), ["bulk.one@email.com", "bulk.two@email.com"])
+        with self.app.app_context():
+            db.session.execute(update(Customers).where(Customers.email == "bulk.one@email.com").values(email="mass.one@email.com"))
+            db.session.execute(update(Customers), [{"id" : 3, "email" : "mass.two@email.com"}])
+            db.session.commit()
+        self.assertEqual(emails("bulk"), [])
+        self.assertEqual(emails("mass"), ["mass.one@email.com", "mass.two@email.com"])
+        with self.app.app_context():
+            db.session.execute(delete(Customers).where(Customers.email.like("mass%")))
+            db.session.commit()
+        self.assertEqual(emails("mass"), [])
+        self.assertEqual(emails("tester"), ["tester@email.com"])
+
+    def test_search_by_email_short_term_and_missing_email(self):
+        response = self.client.get("/customers/search_by_email?email=st")
+        self.assertEqual(len(response.json), 1)
+        response = self.client.get("/customers/search_by_email")
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_search_index_command(self):
+        with self.app.app_context():
+            db.session.execute(delete(search_trigrams))
+            db.session.commit()
+        self.assertEqual(self.client.get("/customers/search_by_email?email=tester").json, [])
+        result = self.app.test_cli_runner().invoke(args=["rebuild-search-index"])
+        self.assertIn("Indexed 1 row(s).", result.output)
+        self.assertEqual(len(self.client.get("/customers/search_by_email?email=tester").json), 1)
@@ -1,6 +1,13 @@
+import json
+import threading
+import time
 import unittest
+from unittest.mock import patch
 from app import create_app
-from app.models import Mechanics, db
+from app.models import Mechanics, Customers, Service_tickets, db
+from sqlalchemy import event
+from app.utils import passwords
+from app.utils.passwords import shutdown_executor, verify_password, PasswordVerificationBusy
 from werkzeug.security import generate_password_hash, check_password_hash
 from app.utils.auth import encode_token
 
@@ -32,7 +39,7 @@ class TestMechanics(unittest.TestCase):
         response = self.client.post('/mechanics', json=mechanic_payload) #sending a test POST request using our test_client and including a JSON body
         self.assertEqual(response.status_code, 201) 
         self.assertEqual(response.json['mechanic_data']['first_name'], "FirstTest")
-        self.assertTrue(check_password_hash(response.json['mechanic_data']['password'], '12345'))
+        self.assertNotIn('password', response.json['mechanic_data'])
         self.assertEqual(response.json['mechanic_data']['last_name'], "LastTest")
         self.assertEqual(response.json['mechanic_data']['email'], "test@email.com")
         self.assertEqual(response.json['mechanic_data']['phone'], "+14082222222")
@@ -191,3 +198,141 @@ class TestMechanics(unittest.TestCase):
         self.assertIn('tickets_count',response.json[0])
         self.assertEqual(response.json[0]['mechanic']['first_name'],'FirstTest')
     
+
+    def test_sort_by_work_orders_by_ticket_count(self):
+        with self.app.app_context():
+            customer = Customers(first_name="C", last_name="C", email="c@email.com", password="x", phone="+1")
+            busy_mechanic = Mechanics(first_name="Busy", last_name="Busy", email="busy@email.com", password="x", phone="+1", salary=1.0)
+            tickets = [Service_tickets(service_desc="desc", price=10.0, VIN=f"VIN{i}", customer=customer) for i in range(2)]
+            db.session.add_all([customer, busy_mechanic] + tickets)
+            db.session.commit()
+            busy_mechanic_id = busy_mechanic.id
+            ticket_ids = [ticket.id for ticket in tickets]
+        for ticket_id in ticket_ids:
+            self.client.put(f'/service_tickets/{ticket_id}/assign-mechanic/{busy_mechanic_id}')
+        response = self.client.get('/mechanics/sort_by_work')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['mechanic']['first_name'] for item in response.json], ['Busy', 'FirstTest'])
+        self.assertEqual([item['tickets_count'] for item in response.json], [2, 0])
+        # limit / offset
+        response = self.client.get('/mechanics/sort_by_work?limit=1&offset=1')
+        self.assertEqual(len(response.json), 1)
+        self.assertEqual(response.json[0]['mechanic']['first_name'], 'FirstTest')
+        response = self.client.get('/mechanics/hard_work_mechanic')
+        self.assertEqual(response.json['mechanic']['first_name'], 'Busy')
+        self.assertEqual(response.json['tickets_count'], 2)
+
+    def test_invalid_limit_sort_by_work(self):
+        response = self.client.get('/mechanics/sort_by_work?limit=-1')
+        self.assertEqual(response.status_code, 400)
+
+    def test_sort_by_work_query_count_is_constant(self):
+        def count_queries():
+            with self.app.app_context():
+                statements = []
+                listener = lambda *args: statements.append(args[2])
+                event.listen(db.engine, "before_cursor_execute", listener)
+                try:
+                    self.client.get('/mechanics/sort_by_work')
+                finally:
+                    event.remove(db.engine, "before_cursor_execute", listener)
+                return len(statements)
+        few_mechanics_queries = count_queries()
+        with self.app.app_context():
+            db.session.add_all([Mechanics(first_name="M", last_name="M", email=f"m{i}@email.com", password="x", phone="+1", salary=1.0) for i in range(20)])
+            db.session.commit()
+        self.assertEqual(count_queries(), few_mechanics_queries)
+
+    def test_stream_mechanics(self):
+        # A cached non-streamed response must not be served to streaming clients
+        self.client.get('/mechanics')
+        response = self.client.get('/mechanics', headers={"Accept": "application/x-ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertIn("tester@email.com", response.get_data(as_text=True))
+
+    def test_login_rehashes_outdated_password(self):
+        login_credentials = {"email": "tester@email.com", "password": "1234"}
+        response = self.client.post('/mechanics/login', json=login_credentials)
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            password_hash = db.session.get(Mechanics, 1).password
+        self.assertTrue(password_hash.startswith("pbkdf2:sha256:1000$"))
+        self.assertTrue(check_password_hash(password_hash, "1234"))
+        # Logging in again with the new hash keeps working
+        response = self.client.post('/mechanics/login', json=login_credentials)
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_with_offloaded_verification(self):
+        self.app.config["PASSWORD_VERIFY_WORKERS"] = 1
+        try:
+            response = self.client.post('/mechanics/login', json={"email": "tester@email.com", "password": "1234"})
+            self.assertEqual(response.status_code, 200)
+            response = self.client.post('/mechanics/login', json={"email": "tester@email.com", "password": "wrong"})
+            self.assertEqual(response.status_code, 400)
+        finally:
+            shutdown_executor()
+
+    def test_timed_out_verification_keeps_its_slot(self):
+        self.app.config.update(PASSWORD_VERIFY_WORKERS=1, PASSWORD_VERIFY_MAX_PENDING=1, PASSWORD_VERIFY_TIMEOUT=0.1)
+        released = threading.Event()
+        slow_check = lambda password_hash, password: released.wait(5)
+        try:
+            with self.app.app_context(), patch("app.utils.passwords.check_password_hash", slow_check):
+                password_hash = db.session.get(Mechanics, 1).password
+                with self.assertRaises(PasswordVerificationBusy):
+                    verify_password(password_hash, "1234")
+                # The timed out hash is still running, so its slot isn't free until it ends
+                self.assertFalse(passwords._pending.acquire(blocking=False))
+                released.set()
+                time.sleep(0.1)
+                self.assertTrue(verify_password(password_hash, "1234"))
+        finally:
+            released.set()
+            shutdown_executor()
+
+    def test_update_mechanic_keeps_unchanged_password(self):
+        headers = {"Authorization" : "Bearer " + self.token}
+        with self.app.app_context():
+            password_hash = db.session.get(Mechanics, 1).password
+        mechanic_payload = {
+            "first_name": "FirstTester",
+            "last_name": "LastTester",
+            "email": "tester@email.com",
+            "phone": "+14082222222",
+            "salary" : 4500.99
+        }
+        response = self.client.put('/mechanics', headers=headers, json=mechanic_payload)
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Mechanics, 1).password, password_hash)
+        response = self.client.put('/mechanics', headers=headers, json={**mechanic_payload, "password" : "5678"})
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertTrue(check_password_hash(db.session.get(Mechanics, 1).password, "5678"))
+
+    def test_read_mechanics_fields(self):
+        response = self.client.get('/mechanics?fields=first_name,ticket_count')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{"first_name" : "FirstTest", "ticket_count" : 0}])
+        response = self.client.get('/mechanics?fields=email', headers={"Accept": "application/x-ndjson"})
+        self.assertEqual([json.loads(line) for line in response.get_data(as_text=True).splitlines()], [{"email" : "tester@email.com"}])
+        response = self.client.get('/mechanics/sort_by_work?fields=id')
+        self.assertEqual(response.json, [{"mechanic" : {"id" : 1}, "tickets_count" : 0}])
+        response = self.client.get('/mechanics?fields=password')
+        self.assertEqual(response.status_code, 400)
+
+    def test_read_mechanics_cache_invalidated_on_write(self):
+        self.assertEqual(len(self.client.get('/mechanics').json), 1)
+        mechanic_payload = {
+            "first_name": "Second",
+            "last_name": "LastTest",
+            "email": "second@email.com",
+            "password" : "12345",
+            "phone": "+14082222222",
+            "salary" : 4000.99
+        }
+        self.client.post('/mechanics', json=mechanic_payload)
+        self.assertEqual(len(self.client.get('/mechanics').json), 2)
+        self.client.delete('/mechanics', headers={"Authorization" : "Bearer " + self.token})
+        self.assertEqual([mechanic["first_name"] for mechanic in self.client.get('/mechanics').json], ["Second"])
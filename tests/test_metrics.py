@@ -0,0 +1,51 @@
+import sqlite3
+import unittest
+from sqlalchemy import exc
+from app import create_app
+from app.models import Mechanics, db
+from werkzeug.security import generate_password_hash
+from app.utils.auth import encode_token, token_cache
+from app.utils.engine import InstrumentedQueuePool, pool_size, postgres_engine_options
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(Mechanics(first_name="FirstTest", last_name="LastTest", email="tester@email.com", password=generate_password_hash('1234'), phone="+19999999", salary=00.00))
+            db.session.commit()
+        token_cache.clear()
+        self.client = self.app.test_client()
+
+    def test_read_metrics(self):
+        response = self.client.get('/metrics', headers={"Authorization" : "Bearer " + encode_token(1, "mechanic")})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.json["db_pool"]["checkouts"], 0)
+        self.assertEqual(response.json["db_pool"]["timeouts"], 0)
+        self.assertIn("hit_rate", response.json["token_cache"])
+
+    def test_read_metrics_customer_not_allowed(self):
+        response = self.client.get('/metrics', headers={"Authorization" : "Bearer " + encode_token(1, "customer")})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pool_records_timeouts(self):
+        pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.05)
+        connection = pool.connect()
+        with self.assertRaises(exc.TimeoutError):
+            pool.connect()
+        connection.close()
+        pool.connect().close()
+        stats = pool.stats()
+        self.assertEqual((stats["checkouts"], stats["timeouts"], stats["max_checked_out"]), (2, 1, 1))
+
+    def test_pool_size_from_workers(self):
+        self.assertEqual(pool_size({"WEB_THREADS" : 8}), 8)
+        self.assertEqual(pool_size({"WEB_THREADS" : 8, "WEB_CONCURRENCY" : 4, "DB_MAX_CONNECTIONS" : 20}), 5)
+        self.assertEqual(pool_size({"WEB_THREADS" : 8, "DB_POOL_SIZE" : 3}), 3)
+
+    def test_postgres_engine_options(self):
+        options = postgres_engine_options({"WEB_THREADS" : 4, "DB_STATEMENT_TIMEOUT_MS" : 5000})
+        self.assertEqual(options["pool_size"], 4)
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertEqual(options["connect_args"]["options"], "-c statement_timeout=5000")
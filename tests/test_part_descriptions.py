@@ -1,4 +1,5 @@
 import unittest
+import json
 from app import create_app
 from app.models import db, PartDescriptions, Parts
 
@@ -83,3 +84,16 @@ class TestPartDescriptions(unittest.TestCase):
         response_related = self.client.delete(f"/part_descriptions/{self.part_desc_id_with_part}")
         self.assertEqual(response_related.status_code, 200)
         self.assertIn("can not delete", response_related.get_json()["message"])
+
+    def test_stream_part_descriptions(self):
+        response = self.client.get("/part_descriptions?stream=true")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual([description["name"] for description in response.get_json()], ["TestPartDesc", "RelatedPartDesc"])
+
+    def test_stream_part_descriptions_ndjson(self):
+        response = self.client.get("/part_descriptions", headers={"Accept": "application/x-ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)["name"] for line in lines], ["TestPartDesc", "RelatedPartDesc"])
@@ -1,6 +1,7 @@
 import unittest
 from app import create_app
 from app.models import db, Parts, PartDescriptions
+from sqlalchemy import event, select
 
 class TestParts(unittest.TestCase):
     def setUp(self):
@@ -104,3 +105,69 @@ class TestParts(unittest.TestCase):
         response_not_found = self.client.delete("/parts/9999")
         self.assertEqual(response_not_found.status_code, 404)
         self.assertIn("Part with id: 9999 not found", response_not_found.get_json()["message"])
+
+    def test_get_all_parts_filters_and_pagination(self):
+        with self.app.app_context():
+            other_desc = PartDescriptions(name="OtherName", price=5.0, made_in="OtherLand")
+            db.session.add(other_desc)
+            db.session.commit()
+            db.session.add_all([Parts(desc_id=other_desc.id, serial_number=f"OP-{i}") for i in range(3)])
+            db.session.commit()
+            other_desc_id = other_desc.id
+        response = self.client.get(f"/parts?desc_id={other_desc_id}")
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data), 3)
+        self.assertTrue(all(item["part_name"] == "OtherName" for item in data))
+        response = self.client.get("/parts?page=2&per_page=3")
+        self.assertEqual([item["part"]["serial_number"] for item in response.get_json()], ["OP-2"])
+        response = self.client.get("/parts?ticket_id=9999")
+        self.assertEqual(response.get_json(), [])
+
+    def test_get_all_parts_paged_by_default(self):
+        with self.app.app_context():
+            db.session.add_all([Parts(desc_id=self.part_desc_id, serial_number=f"DP-{i}") for i in range(24)])
+            db.session.commit()
+        response = self.client.get("/parts")
+        self.assertEqual(len(response.get_json()), 20)
+        self.assertEqual(len(self.client.get("/parts?page=2").get_json()), 5)
+        self.app.config["MAX_PAGE_SIZE"] = 3
+        self.assertEqual(len(self.client.get("/parts?per_page=50").get_json()), 3)
+
+    def test_get_all_parts_single_query(self):
+        with self.app.app_context():
+            db.session.add_all([Parts(desc_id=self.part_desc_id, serial_number=f"QP-{i}") for i in range(10)])
+            db.session.commit()
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                response = self.client.get("/parts")
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+        self.assertEqual(len(response.get_json()), 11)
+        self.assertEqual(len(statements), 1)
+
+    def test_create_parts_skip_taken_serial_numbers(self):
+        with self.app.app_context():
+            db.session.add_all([Parts(desc_id=self.part_desc_id, serial_number=serial) for serial in ["BP-001-1", "BP-001-3"]])
+            db.session.commit()
+        part_payload = {
+            "desc_id": self.part_desc_id,
+            "serial_number": "BP-001"
+        }
+        response = self.client.post("/parts?qty=3", json=part_payload)
+        self.assertEqual(response.status_code, 200)
+        part_ids = response.get_json()["part_ids"]
+        self.assertEqual(len(part_ids), 3)
+        with self.app.app_context():
+            serials = db.session.scalars(select(Parts.serial_number).where(Parts.id.in_(part_ids)).order_by(Parts.id)).all()
+        self.assertEqual(serials, ["BP-001-2", "BP-001-4", "BP-001-5"])
+
+    def test_stream_parts(self):
+        response = self.client.get(f"/parts?stream=true&desc_id={self.part_desc_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        data = response.get_json()
+        self.assertEqual(data[0]["part"]["serial_number"], "BP-001")
+        self.assertEqual(data[0]["part_name"], "TestName")
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+import unittest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, MovingWindowRateLimiter
+from app import create_app
+from app.utils.auth import encode_token, token_cache
+from app.utils.rate_limit import SQLiteStorage, rate_limit_key
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        token_cache.clear()
+        handle, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.uri = f"sqlite:///{self.path}"
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_storage_from_uri(self):
+        storage = storage_from_string(self.uri)
+        self.assertIsInstance(storage, SQLiteStorage)
+        self.assertEqual(storage.path, self.path)
+        self.assertTrue(storage.check())
+
+    def test_fixed_window_is_shared_between_storages(self):
+        # Two storages on the same file stand in for two gunicorn workers
+        first, second = FixedWindowRateLimiter(SQLiteStorage(self.uri)), FixedWindowRateLimiter(SQLiteStorage(self.uri))
+        limit = parse("3 per minute")
+        self.assertTrue(first.hit(limit, "127.0.0.1"))
+        self.assertTrue(second.hit(limit, "127.0.0.1"))
+        self.assertTrue(first.hit(limit, "127.0.0.1"))
+        self.assertFalse(second.hit(limit, "127.0.0.1"))
+        self.assertTrue(second.hit(limit, "127.0.0.2"))
+
+    def test_fixed_window_expires(self):
+        storage = SQLiteStorage(self.uri)
+        self.assertEqual(storage.incr("key", 1), 1)
+        self.assertEqual(storage.incr("key", 1), 2)
+        time.sleep(1.1)
+        self.assertEqual(storage.get("key"), 0)
+        self.assertEqual(storage.incr("key", 1), 1)
+        storage.purge(time.time() + 2)
+        self.assertEqual(storage.get("key"), 0)
+
+    def test_moving_window_is_shared_between_storages(self):
+        first, second = MovingWindowRateLimiter(SQLiteStorage(self.uri)), MovingWindowRateLimiter(SQLiteStorage(self.uri))
+        limit = parse("2 per minute")
+        self.assertTrue(first.hit(limit, "user"))
+        self.assertTrue(second.hit(limit, "user"))
+        self.assertFalse(first.hit(limit, "user"))
+        stats = second.get_window_stats(limit, "user")
+        self.assertEqual(stats.remaining, 0)
+        first.clear(limit, "user")
+        self.assertTrue(second.hit(limit, "user"))
+
+    def test_key_is_user_for_valid_token(self):
+        headers = {"Authorization" : "Bearer " + encode_token(7, "customer")}
+        with self.app.test_request_context('/', headers=headers, environ_base={"REMOTE_ADDR" : "10.0.0.1"}):
+            self.assertEqual(rate_limit_key(), "customer:7")
+
+    def test_key_falls_back_to_address(self):
+        with self.app.test_request_context('/', environ_base={"REMOTE_ADDR" : "10.0.0.1"}):
+            self.assertEqual(rate_limit_key(), "10.0.0.1")
+        headers = {"Authorization" : "Bearer 123asdasd"}
+        with self.app.test_request_context('/', headers=headers, environ_base={"REMOTE_ADDR" : "10.0.0.1"}):
+            self.assertEqual(rate_limit_key(), "10.0.0.1")
@@ -0,0 +1,126 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import insert
+from app import create_app
+from app.models import db, Customers, Mechanics, Service_tickets, Parts, PartDescriptions, ticket_mechanics
+from app.utils.auth import encode_token
+
+class TestReports(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([
+                Customers(first_name="Ann", last_name="A", email="ann@email.com", password="x", phone="+1"),
+                Customers(first_name="Bob", last_name="B", email="bob@email.com", password="x", phone="+1"),
+                Mechanics(first_name="Max", last_name="M", email="max@email.com", password="x", phone="+1", salary=1.0),
+                Mechanics(first_name="Sam", last_name="S", email="sam@email.com", password="x", phone="+1", salary=1.0),
+                PartDescriptions(name="Brake", price=10.0, made_in="USA"),
+                PartDescriptions(name="Tire", price=20.0, made_in="Germany"),
+            ])
+            db.session.commit()
+            db.session.add_all([
+                Service_tickets(customer_id=1, service_desc="desc", price=100.0, VIN="VIN1", created_at=datetime(2024, 1, 1, 9)),
+                Service_tickets(customer_id=1, service_desc="desc", price=50.0, VIN="VIN2", created_at=datetime(2024, 1, 2, 9)),
+                Service_tickets(customer_id=2, service_desc="desc", price=30.0, VIN="VIN3", created_at=datetime(2024, 1, 2, 18)),
+            ])
+            db.session.commit()
+            db.session.execute(insert(ticket_mechanics), [
+                {"service_ticket_id" : 1, "mechanic_id" : 1},
+                {"service_ticket_id" : 1, "mechanic_id" : 2},
+                {"service_ticket_id" : 2, "mechanic_id" : 1},
+            ])
+            db.session.execute(insert(Parts), [
+                {"desc_id" : 1, "serial_number" : "SN1", "ticket_id" : 1},
+                {"desc_id" : 2, "serial_number" : "SN2", "ticket_id" : 2},
+                {"desc_id" : 2, "serial_number" : "SN3", "ticket_id" : 3},
+                {"desc_id" : 1, "serial_number" : "SN4", "ticket_id" : None},
+            ])
+            db.session.commit()
+        self.headers = {"Authorization" : "Bearer " + encode_token(1, "mechanic")}
+        self.client = self.app.test_client()
+
+    def refresh(self, *args):
+        return self.app.test_cli_runner().invoke(args=["refresh-reports", *args]).output
+
+    def report(self, name, query=""):
+        response = self.client.get(f"/reports/{name}{query}", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()["items"]
+
+    def test_reports(self):
+        self.assertEqual(self.refresh(), "Refreshed 2 day(s).\n")
+        self.assertEqual(self.report("daily"), [
+            {"day" : "2024-01-01", "tickets" : 1, "labor" : 100.0, "parts" : 10.0, "total" : 110.0},
+            {"day" : "2024-01-02", "tickets" : 2, "labor" : 80.0, "parts" : 40.0, "total" : 120.0},
+        ])
+        # Ticket 1's labor is shared by its two mechanics
+        self.assertEqual(self.report("mechanic_revenue"), [
+            {"mechanic_id" : 1, "first_name" : "Max", "last_name" : "M", "tickets" : 2, "revenue" : 100.0},
+            {"mechanic_id" : 2, "first_name" : "Sam", "last_name" : "S", "tickets" : 1, "revenue" : 50.0},
+        ])
+        self.assertEqual(self.report("parts_usage"), [
+            {"made_in" : "Germany", "parts" : 2, "revenue" : 40.0},
+            {"made_in" : "USA", "parts" : 1, "revenue" : 10.0},
+        ])
+        self.assertEqual(self.report("top_customers", "?limit=1"), [
+            {"customer_id" : 1, "first_name" : "Ann", "last_name" : "A", "tickets" : 2, "revenue" : 180.0},
+        ])
+        self.assertEqual([item["day"] for item in self.report("daily", "?start=2024-01-02&end=2024-01-31")], ["2024-01-02"])
+        self.assertEqual(self.report("parts_usage", "?end=2024-01-01"), [{"made_in" : "USA", "parts" : 1, "revenue" : 10.0}])
+
+    def test_incremental_refresh(self):
+        self.refresh()
+        self.assertEqual(self.refresh(), "Refreshed 0 day(s).\n")
+        self.assertEqual(self.report("daily")[0]["parts"], 10.0)
+        # A part added to ticket 1 only rebuilds its day, the cached report follows the refresh
+        self.client.put("/service_tickets/1/add_part/4")
+        self.assertEqual(self.refresh(), "Refreshed 1 day(s).\n")
+        self.assertEqual(self.report("daily")[0]["parts"], 20.0)
+        # A mechanic removed from ticket 1 gets no share of its labor anymore
+        self.client.put("/service_tickets/1/remove-mechanic/2")
+        self.refresh()
+        self.assertEqual([(item["mechanic_id"], item["revenue"]) for item in self.report("mechanic_revenue")], [(1, 150.0)])
+        # Deleted tickets queue their day for the next refresh
+        self.client.delete("/service_tickets/3")
+        self.assertEqual(self.refresh(), "Refreshed 1 day(s).\n")
+        self.assertEqual([item["customer_id"] for item in self.report("top_customers")], [1])
+        # A new part price changes the days of the tickets using it
+        self.client.put("/part_descriptions/2", json={"name" : "Tire", "price" : 25.0, "made_in" : "Germany"})
+        self.assertEqual(self.refresh(), "Refreshed 1 day(s).\n")
+        self.assertEqual(self.report("parts_usage"), [
+            {"made_in" : "USA", "parts" : 2, "revenue" : 20.0},
+            {"made_in" : "Germany", "parts" : 1, "revenue" : 25.0},
+        ])
+        # A write is picked up whatever its timestamps, e.g. one that committed long after it set updated_at
+        with self.app.app_context():
+            db.session.add(Service_tickets(customer_id=2, service_desc="desc", price=5.0, VIN="VIN4",
+                                           created_at=datetime(2024, 1, 1, 12), updated_at=datetime(2000, 1, 1)))
+            db.session.commit()
+        self.assertEqual(self.refresh(), "Refreshed 1 day(s).\n")
+        self.assertEqual(self.report("daily")[0]["tickets"], 2)
+        # A full rebuild gives the same rollups
+        incremental = [self.report(name) for name in ["daily", "mechanic_revenue", "parts_usage", "top_customers"]]
+        self.assertEqual(self.refresh("--full"), "Refreshed 2 day(s).\n")
+        self.assertEqual([self.report(name) for name in ["daily", "mechanic_revenue", "parts_usage", "top_customers"]], incremental)
+
+    def test_refresh_after_customer_deleted(self):
+        self.refresh()
+        response = self.client.delete("/customers", headers={"Authorization" : "Bearer " + encode_token(1, "customer")})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(), "Refreshed 2 day(s).\n")
+        self.assertEqual(self.report("daily"), [{"day" : "2024-01-02", "tickets" : 1, "labor" : 30.0, "parts" : 20.0, "total" : 50.0}])
+        self.assertEqual(self.report("mechanic_revenue"), [])
+        # The queue was emptied by the refresh
+        self.assertEqual(self.refresh(), "Refreshed 0 day(s).\n")
+
+    def test_invalid_report_requests(self):
+        self.assertEqual(self.client.get("/reports/daily").status_code, 401)
+        response = self.client.get("/reports/daily?start=yesterday", headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "start and end have to be dates like 2024-01-31")
+        response = self.client.get("/reports/daily?start=2024-02-01&end=2024-01-01", headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/reports/top_customers?limit=0", headers=self.headers)
+        self.assertEqual(response.status_code, 400)
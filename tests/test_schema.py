@@ -0,0 +1,145 @@
+import sqlite3
+import unittest
+from sqlalchemy import event, inspect, text, insert, select
+from sqlalchemy.exc import IntegrityError
+from app import create_app
+from app.models import db, Customers, Mechanics, Service_tickets, Parts, PartDescriptions, ticket_mechanics, report_daily
+from app.migrations import schema_version, migrations
+from app.utils.caching import tag_versions
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            schema_version.drop(db.engine, checkfirst=True)
+            db.create_all()
+            db.session.add(Customers(first_name="FirstTest", last_name="LastTest", email="tester@email.com", password="x", phone="+19999999"))
+            db.session.add(Mechanics(first_name="FirstTest", last_name="LastTest", email="tester@email.com", password="x", phone="+19999999", salary=00.00))
+            db.session.add(PartDescriptions(name="Brake", price=5.0, made_in="USA"))
+            db.session.add(Service_tickets(customer_id=1, service_desc="desc", price=10.0, VIN="VIN1"))
+            db.session.add(Parts(ticket_id=1, desc_id=1, serial_number="SN1"))
+            db.session.commit()
+            db.session.execute(insert(ticket_mechanics).values(service_ticket_id=1, mechanic_id=1))
+            db.session.commit()
+
+    def query_plans(self, load):
+        # EXPLAIN QUERY PLAN of every statement `load` runs, e.g. a lazy relationship load
+        statements = []
+        listener = lambda conn, cursor, statement, parameters, context, executemany: statements.append((statement, parameters))
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            load()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        self.assertTrue(statements)
+        with db.engine.connect() as connection:
+            return [[row[3] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)] for statement, parameters in statements]
+
+    def assert_uses_indexes(self, load):
+        for plan in self.query_plans(load):
+            for step in plan:
+                self.assertTrue(step.startswith("SEARCH"), f"full scan in query plan: {plan}")
+
+    def test_relationship_loads_use_indexes(self):
+        with self.app.app_context():
+            customer = db.session.get(Customers, 1)
+            mechanic = db.session.get(Mechanics, 1)
+            service_ticket = db.session.get(Service_tickets, 1)
+            part_description = db.session.get(PartDescriptions, 1)
+            self.assert_uses_indexes(lambda: customer.service_tickets)
+            self.assert_uses_indexes(lambda: mechanic.tickets)
+            self.assert_uses_indexes(lambda: service_ticket.parts)
+            self.assert_uses_indexes(lambda: service_ticket.mechanics)
+            self.assert_uses_indexes(lambda: part_description.parts)
+
+    def test_duplicate_assignment_rejected(self):
+        with self.app.app_context():
+            with self.assertRaises(IntegrityError):
+                db.session.execute(insert(ticket_mechanics).values(service_ticket_id=1, mechanic_id=1))
+            db.session.rollback()
+
+    def test_upgrade_empty_database(self):
+        with self.app.app_context():
+            db.drop_all()
+            versions = tag_versions(["customers", "reports", "service_tickets:*"])
+        result = self.app.test_cli_runner().invoke(args=["db-upgrade"])
+        # The migrations write on a bare connection, so the command drops every cached view itself
+        with self.app.app_context():
+            self.assertTrue(all(before != after for before, after in zip(versions, tag_versions(["customers", "reports", "service_tickets:*"]))))
+        latest = migrations()[-1][0]
+        self.assertIn("Applied 0001_baseline.", result.output)
+        self.assertIn(f"Database is at version {latest}.", result.output)
+        with self.app.app_context():
+            inspector = inspect(db.engine)
+            self.assertTrue(all(inspector.has_table(table) for table in db.metadata.tables))
+        # Running it again changes nothing
+        result = self.app.test_cli_runner().invoke(args=["db-upgrade"])
+        self.assertEqual(result.output, f"Database is at version {latest}.\n")
+
+    def schema(self):
+        # Tables with their columns, keys and indexes, defaults left out (the migrations keep theirs)
+        inspector = inspect(db.engine)
+        return {
+            table : (
+                [(column["name"], str(column["type"]), column["nullable"]) for column in inspector.get_columns(table)],
+                inspector.get_pk_constraint(table)["constrained_columns"],
+                sorted((key["constrained_columns"], key["referred_table"]) for key in inspector.get_foreign_keys(table)),
+                sorted((index["name"], index["column_names"], bool(index["unique"])) for index in inspector.get_indexes(table)),
+                sorted(constraint["column_names"] for constraint in inspector.get_unique_constraints(table)),
+            )
+            for table in sorted(db.metadata.tables)
+        }
+
+    def test_migrations_match_models(self):
+        # A new database built by the migrations alone ends up with the schema of create_all()
+        with self.app.app_context():
+            expected = self.schema()
+            db.drop_all()
+        self.app.test_cli_runner().invoke(args=["db-upgrade"])
+        with self.app.app_context():
+            self.assertEqual(self.schema(), expected)
+
+    def test_upgrade_database_created_before_migrations(self):
+        # Recreate the schema of an older database: no ticket_count, no indexes on foreign keys, no key on
+        # ticket_mechanics (so duplicate and orphaned assignments) and no search index.
+        # A plain sqlite3 connection has foreign keys off, like the app had before.
+        with self.app.app_context():
+            db.engine.dispose()
+            connection = sqlite3.connect(db.engine.url.database)
+        for index in ["ix_service_tickets_customer_id", "ix_parts_ticket_id", "ix_parts_desc_id", "ix_mechanics_workload",
+                      "ix_service_tickets_created_at", "ix_service_tickets_updated_at", "ix_part_descriptions_updated_at"]:
+            connection.execute(f"DROP INDEX {index}")
+        connection.execute("ALTER TABLE mechanics DROP COLUMN ticket_count")
+        connection.execute("ALTER TABLE service_tickets DROP COLUMN created_at")
+        connection.execute("ALTER TABLE service_tickets DROP COLUMN updated_at")
+        connection.execute("ALTER TABLE part_descriptions DROP COLUMN updated_at")
+        for table in ["report_daily", "report_mechanic_daily", "report_customer_daily", "report_parts_daily", "report_pending_days", "report_watermark"]:
+            connection.execute(f"DROP TABLE {table}")
+        connection.execute("DROP TABLE ticket_mechanics")
+        connection.execute("DROP TABLE search_trigrams")
+        connection.execute("CREATE TABLE ticket_mechanics (service_ticket_id INTEGER NOT NULL REFERENCES service_tickets (id), mechanic_id INTEGER NOT NULL REFERENCES mechanics (id))")
+        connection.execute("INSERT INTO ticket_mechanics VALUES (1, 1), (1, 1), (2, 1)")
+        connection.commit()
+        connection.close()
+        result = self.app.test_cli_runner().invoke(args=["db-upgrade", "--target", "3"])
+        self.assertIn("Applied 0003_foreign_key_indexes.", result.output)
+        self.assertIn("Database is at version 3.", result.output)
+        with self.app.app_context():
+            inspector = inspect(db.engine)
+            self.assertEqual(inspector.get_pk_constraint("ticket_mechanics")["constrained_columns"], ["service_ticket_id", "mechanic_id"])
+            self.assertIn("ix_ticket_mechanics_mechanic_id", [index["name"] for index in inspector.get_indexes("ticket_mechanics")])
+            self.assertIn("ix_mechanics_workload", [index["name"] for index in inspector.get_indexes("mechanics")])
+            self.assertFalse(inspector.has_table("search_trigrams"))
+            self.assertEqual(db.session.get(Mechanics, 1).ticket_count, 1)
+        result = self.app.test_cli_runner().invoke(args=["db-upgrade"])
+        self.assertIn("Applied 0004_search_trigrams.", result.output)
+        self.assertIn("Applied 0005_reporting.", result.output)
+        response = self.app.test_client().get("/customers/search_by_email?email=tester")
+        self.assertEqual(len(response.get_json()), 1)
+        # Existing tickets are dated by the migration and in the rollups after the first refresh
+        with self.app.app_context():
+            self.assertIsNotNone(db.session.get(Service_tickets, 1).created_at)
+        self.assertEqual(self.app.test_cli_runner().invoke(args=["refresh-reports"]).output, "Refreshed 1 day(s).\n")
+        with self.app.app_context():
+            self.assertEqual(db.session.execute(select(report_daily.c.tickets, report_daily.c.labor, report_daily.c.parts)).all(), [(1, 10.0, 5.0)])
@@ -0,0 +1,74 @@
+import sys
+import unittest
+from datetime import datetime
+from sqlalchemy import Integer, Float, String, DateTime
+from marshmallow import Schema, post_dump
+from app import create_app
+from app.models import Customers, Mechanics, Parts, PartDescriptions, Service_tickets
+from app.utils.serializers import CompiledSchema, compile_serializer
+from app.blueprints.customers.schemas import customer_schema, customers_schema, customer_login_schema
+from app.blueprints.mechanics.schemas import mechanic_schema
+from app.blueprints.parts.schemas import part_schema
+from app.blueprints.part_descriptions.schemas import part_description_schema
+from app.blueprints.service_tickets.schemas import service_ticket_schema
+
+class TestSerializers(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        self.customer = Customers(id=1, first_name="FirstTest", last_name="LastTest", email="tester@email.com", password="x", phone="+19999999", address=None)
+        self.objects = [
+            (customer_schema, self.customer),
+            (customer_login_schema, self.customer),
+            (mechanic_schema, Mechanics(id=2, first_name="F", last_name="L", email="m@email.com", password="x", phone="+1", salary=10, ticket_count=3)),
+            (part_schema, Parts(id=3, ticket_id=None, desc_id=4, serial_number="SN1")),
+            (part_description_schema, PartDescriptions(id=4, name="Brake", price=5, made_in="USA")),
+            (service_ticket_schema, Service_tickets(id=5, customer_id=1, service_desc="desc", price=10.5, VIN="VIN1")),
+        ]
+
+    def test_compiled_dump_matches_marshmallow(self):
+        for schema, obj in self.objects:
+            self.assertIsNotNone(compile_serializer(schema))
+            self.assertEqual(schema.dump(obj), Schema.dump(schema, obj))
+        # Float columns come back as float even when given an int
+        self.assertIsInstance(mechanic_schema.dump(self.objects[2][1])["salary"], float)
+
+    def test_compiled_dump_many(self):
+        customers = [self.customer, self.customer]
+        self.assertEqual(customers_schema.dump(customers), Schema.dump(customers_schema, customers))
+        self.assertEqual(customer_schema.dump(customers, many=True), [customer_schema.dump(self.customer)] * 2)
+
+    def test_hooks_keep_marshmallow_path(self):
+        class HookedSchema(CompiledSchema):
+            class Meta:
+                model = Customers
+
+            @post_dump
+            def add_name(self, data, **kwargs):
+                data["name"] = f"{data['first_name']} {data['last_name']}"
+                return data
+
+        schema = HookedSchema()
+        self.assertIsNone(compile_serializer(schema))
+        self.assertEqual(schema.dump(self.customer)["name"], "FirstTest LastTest")
+
+    def test_every_app_schema_matches_marshmallow(self):
+        # Every schema instance the blueprints use, on a row with every column set and one with the nullable ones empty
+        values = {Integer : 7, Float : 2.5, String : "Text", DateTime : datetime(2024, 1, 2, 3, 4, 5)}
+        schemas = {
+            id(schema) : schema
+            for name, module in list(sys.modules.items()) if name.startswith("app.blueprints")
+            for schema in vars(module).values() if isinstance(schema, CompiledSchema)
+        }
+        self.assertTrue(schemas)
+        for schema in schemas.values():
+            model = schema.opts.model
+            full = model(**{column.key : values[type(column.type)] for column in model.__table__.columns})
+            empty = model(**{column.key : None if column.nullable else values[type(column.type)] for column in model.__table__.columns})
+            for obj in [full, empty]:
+                self.assertEqual(schema.dump(obj, many=False), Schema.dump(schema, obj, many=False), type(schema).__name__)
+            self.assertEqual(schema.dump([full, empty], many=True), Schema.dump(schema, [full, empty], many=True))
+
+    def test_hook_detection_fails_safe(self):
+        schema = type(customer_schema)()
+        schema._hooks = None
+        self.assertIsNone(compile_serializer(schema))
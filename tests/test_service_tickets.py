@@ -1,6 +1,8 @@
 import unittest
 from app import create_app
-from app.models import db, Customers, Mechanics, Parts, PartDescriptions, Service_tickets
+from app.models import db, Customers, Mechanics, Parts, PartDescriptions, Service_tickets, ticket_mechanics
+from sqlalchemy import update, delete, insert, event
+from unittest.mock import patch
 from werkzeug.security import generate_password_hash
 from app.utils.auth import encode_token
 
@@ -130,3 +132,241 @@ class TestServiceTickets(unittest.TestCase):
         response_rm2 = self.client.put(f"/service_tickets/{self.service_ticket_id}/remove_part/{self.part_id}")
         self.assertEqual(response_rm2.status_code, 200)
         self.assertIn("is not in service_ticket", response_rm2.get_json()["message"])
+
+    def count_queries(self, method, url):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        with self.app.app_context():
+            event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                response = method(url)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_membership_changes_do_not_load_collections(self):
+        # The number of queries stays the same when the service ticket already has many mechanics and parts
+        def count_all():
+            base = f"/service_tickets/{self.service_ticket_id}"
+            return [
+                self.count_queries(self.client.put, f"{base}/assign-mechanic/{self.mechanic_id}"),
+                self.count_queries(self.client.put, f"{base}/assign-mechanic/{self.mechanic_id}"),
+                self.count_queries(self.client.put, f"{base}/remove-mechanic/{self.mechanic_id}"),
+                self.count_queries(self.client.put, f"{base}/remove-mechanic/{self.mechanic_id}"),
+                self.count_queries(self.client.put, f"{base}/add_part/{self.part_id}"),
+                self.count_queries(self.client.put, f"{base}/add_part/{self.part_id}"),
+                self.count_queries(self.client.put, f"{base}/remove_part/{self.part_id}"),
+                self.count_queries(self.client.put, f"{base}/remove_part/{self.part_id}"),
+            ]
+        few = count_all()
+        # A change also queues the ticket's day for the reporting rollups
+        self.assertEqual(few, [5, 3, 5, 3, 4, 2, 4, 3])
+        with self.app.app_context():
+            mechanic_ids = db.session.scalars(insert(Mechanics).returning(Mechanics.id), [
+                {"first_name" : "M", "last_name" : "M", "email" : f"m{i}@email.com", "password" : "x", "phone" : "+1", "salary" : 1.0}
+                for i in range(50)
+            ]).all()
+            db.session.execute(insert(ticket_mechanics), [{"service_ticket_id" : self.service_ticket_id, "mechanic_id" : mechanic_id} for mechanic_id in mechanic_ids])
+            db.session.execute(insert(Parts), [{"desc_id" : 1, "serial_number" : f"S{i}", "ticket_id" : self.service_ticket_id} for i in range(200)])
+            db.session.commit()
+        self.assertEqual(count_all(), few)
+
+    def get_ticket_count(self):
+        with self.app.app_context():
+            return db.session.get(Mechanics, self.mechanic_id).ticket_count
+
+    def test_mechanic_ticket_count_is_maintained(self):
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/assign-mechanic/{self.mechanic_id}")
+        self.assertEqual(self.get_ticket_count(), 1)
+        # Assigning twice does not count twice
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/assign-mechanic/{self.mechanic_id}")
+        self.assertEqual(self.get_ticket_count(), 1)
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/remove-mechanic/{self.mechanic_id}")
+        self.assertEqual(self.get_ticket_count(), 0)
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/assign-mechanic/{self.mechanic_id}")
+        self.client.delete(f"/service_tickets/{self.service_ticket_id}")
+        self.assertEqual(self.get_ticket_count(), 0)
+
+    def test_rebuild_ticket_counts_command(self):
+        with self.app.app_context():
+            db.session.execute(ticket_mechanics.insert().values(service_ticket_id=self.service_ticket_id, mechanic_id=self.mechanic_id))
+            db.session.commit()
+        self.assertEqual(self.get_ticket_count(), 0)
+        result = self.app.test_cli_runner().invoke(args=["rebuild-ticket-counts"])
+        self.assertIn("Rebuilt ticket_count for 1 mechanic(s).", result.output)
+        self.assertEqual(self.get_ticket_count(), 1)
+
+    def test_read_service_tickets_cursor_pagination(self):
+        with self.app.app_context():
+            db.session.add_all([Service_tickets(service_desc=f"Desc{i}", price=10.0, VIN=f"VIN{i}", customer_id=self.customer_id) for i in range(3)])
+            db.session.commit()
+        self.app.config["MAX_PAGE_SIZE"] = 3
+        response = self.client.get("/service_tickets?limit=50")
+        data = response.get_json()
+        self.assertEqual(len(data["items"]), 3)
+        response = self.client.get(f"/service_tickets?limit=50&after={data['next_cursor']}")
+        data = response.get_json()
+        self.assertEqual([ticket["service_desc"] for ticket in data["items"]], ["Desc2"])
+        self.assertIsNone(data["next_cursor"])
+
+    def test_read_service_ticket_cache_invalidated_on_update(self):
+        self.assertEqual(self.client.get(f"/service_tickets/{self.service_ticket_id}").get_json()["service_desc"], "TestDesc")
+        self.assertEqual(self.client.get(f"/service_tickets/mechanics/{self.service_ticket_id}").get_json(), [])
+        self.client.put(f"/service_tickets/{self.service_ticket_id}", json={"service_desc": "Updated", "price": 25.0, "VIN": "VIN789"})
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/assign-mechanic/{self.mechanic_id}")
+        self.assertEqual(self.client.get(f"/service_tickets/{self.service_ticket_id}").get_json()["service_desc"], "Updated")
+        self.assertEqual(len(self.client.get(f"/service_tickets/mechanics/{self.service_ticket_id}").get_json()), 1)
+
+    def test_cache_invalidated_by_session_events(self):
+        self.assertEqual(self.client.get(f"/service_tickets/{self.service_ticket_id}").get_json()["service_desc"], "TestDesc")
+        self.assertEqual(len(self.client.get("/mechanics").get_json()), 1)
+        # Changes made outside the routes invalidate the cached views as soon as they are committed
+        with self.app.app_context():
+            db.session.get(Service_tickets, self.service_ticket_id).service_desc = "Changed"
+            db.session.add(Mechanics(first_name="Other", last_name="Other", email="other@email.com", password="x", phone="+1", salary=1))
+            db.session.commit()
+        self.assertEqual(self.client.get(f"/service_tickets/{self.service_ticket_id}").get_json()["service_desc"], "Changed")
+        self.assertEqual(len(self.client.get("/mechanics").get_json()), 2)
+        # Bulk statements too
+        with self.app.app_context():
+            db.session.execute(update(Service_tickets).where(Service_tickets.id == self.service_ticket_id).values(service_desc="Bulk"))
+            db.session.commit()
+        self.assertEqual(self.client.get(f"/service_tickets/{self.service_ticket_id}").get_json()["service_desc"], "Bulk")
+
+    def test_error_responses_not_cached(self):
+        self.assertEqual(self.client.get("/service_tickets/2").status_code, 404)
+        # A row written outside db.session (another app, a migration) isn't seen by the invalidation
+        with self.app.app_context(), db.engine.begin() as connection:
+            connection.execute(insert(Service_tickets).values(service_desc="Outside", price=1.0, VIN="VIN001", customer_id=self.customer_id))
+        response = self.client.get("/service_tickets/2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["service_desc"], "Outside")
+
+    def test_cache_tags_for_statements(self):
+        with self.app.app_context():
+            self.client.get(f"/service_tickets/{self.service_ticket_id}")
+            captured = []
+            with patch("app.utils.cache_invalidation.invalidate_tags", side_effect=lambda *tags: captured.append(set(tags))):
+                db.session.execute(delete(ticket_mechanics).where(ticket_mechanics.c.service_ticket_id == self.service_ticket_id))
+                db.session.execute(update(Parts).where(Parts.id.in_([self.part_id]), Parts.ticket_id.is_(None)).values(ticket_id=self.service_ticket_id))
+                db.session.commit()
+                self.assertEqual(captured, [{"mechanics", "parts", f"service_ticket:{self.service_ticket_id}"}])
+                # Rolled back changes don't invalidate anything
+                db.session.execute(update(Service_tickets).values(price=1.0))
+                db.session.rollback()
+                db.session.commit()
+                self.assertEqual(len(captured), 1)
+
+    def test_assign_mechanics_in_bulk(self):
+        with self.app.app_context():
+            db.session.add(Mechanics(first_name="Other", last_name="Other", email="other@email.com", password="x", phone="+1", salary=1))
+            db.session.commit()
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/assign-mechanic/{self.mechanic_id}")
+        self.assertEqual(len(self.client.get(f"/service_tickets/mechanics/{self.service_ticket_id}").get_json()), 1)
+        response = self.client.put(f"/service_tickets/{self.service_ticket_id}/assign-mechanics", json={"mechanic_ids" : [self.mechanic_id, 2, 99, 2]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"added" : [2], "skipped" : [self.mechanic_id], "missing" : [99]})
+        self.assertEqual(len(self.client.get(f"/service_tickets/mechanics/{self.service_ticket_id}").get_json()), 2)
+        self.assertEqual(self.get_ticket_count(), 1)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Mechanics, 2).ticket_count, 1)
+        response = self.client.put(f"/service_tickets/{self.service_ticket_id}/assign-mechanics", json={"mechanic_ids" : []})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put("/service_tickets/99/assign-mechanics", json={"mechanic_ids" : [self.mechanic_id]})
+        self.assertEqual(response.status_code, 404)
+
+    def test_add_parts_in_bulk(self):
+        with self.app.app_context():
+            other_ticket = Service_tickets(service_desc="Other", price=1.0, VIN="VIN001", customer_id=self.customer_id)
+            db.session.add(other_ticket)
+            db.session.commit()
+            db.session.add_all([Parts(desc_id=1, serial_number="P-002"),
+                                Parts(desc_id=1, serial_number="P-003", ticket_id=other_ticket.id)])
+            db.session.commit()
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/add_part/{self.part_id}")
+        response = self.client.put(f"/service_tickets/{self.service_ticket_id}/add_parts", json={"part_ids" : [self.part_id, 2, 3, 99]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"added" : [2], "skipped" : [self.part_id], "unavailable" : [3], "missing" : [99]})
+        response = self.client.get(f"/parts?ticket_id={self.service_ticket_id}")
+        self.assertEqual(sorted(part["part"]["id"] for part in response.get_json()), [self.part_id, 2])
+        response = self.client.put(f"/service_tickets/{self.service_ticket_id}/add_parts", json={"part_ids" : ["one"]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_read_service_ticket_expanded(self):
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/assign-mechanic/{self.mechanic_id}")
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/add_part/{self.part_id}")
+        response = self.client.get(f"/service_tickets/{self.service_ticket_id}?expand=customer,mechanics,parts.part_description")
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["service_desc"], "TestDesc")
+        self.assertEqual(data["customer"]["email"], "custmer_test@email.com")
+        self.assertNotIn("password", data["customer"])
+        self.assertEqual([mechanic["id"] for mechanic in data["mechanics"]], [self.mechanic_id])
+        self.assertNotIn("password", data["mechanics"][0])
+        self.assertEqual(data["parts"][0]["serial_number"], "P-001")
+        self.assertEqual(data["parts"][0]["part_description"]["name"], "TestPartDescription")
+        # Only what was asked for is embedded
+        data = self.client.get(f"/service_tickets/{self.service_ticket_id}?expand=parts").get_json()
+        self.assertNotIn("customer", data)
+        self.assertNotIn("part_description", data["parts"][0])
+        response = self.client.get(f"/service_tickets/{self.service_ticket_id}?expand=invoices")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "unknown expansion(s): invoices")
+
+    def test_read_service_ticket_expanded_query_count(self):
+        with self.app.app_context():
+            mechanic_ids = db.session.scalars(insert(Mechanics).returning(Mechanics.id), [
+                {"first_name" : "M", "last_name" : "M", "email" : f"m{i}@email.com", "password" : "x", "phone" : "+1", "salary" : 1.0}
+                for i in range(30)
+            ]).all()
+            db.session.execute(insert(ticket_mechanics), [{"service_ticket_id" : self.service_ticket_id, "mechanic_id" : mechanic_id} for mechanic_id in mechanic_ids])
+            db.session.execute(insert(Parts), [{"desc_id" : 1, "serial_number" : f"S{i}", "ticket_id" : self.service_ticket_id} for i in range(100)])
+            db.session.commit()
+        # The ticket with its customer, then the mechanics, then the parts with their descriptions
+        queries = self.count_queries(self.client.get, f"/service_tickets/{self.service_ticket_id}?expand=customer,mechanics,parts.part_description")
+        self.assertEqual(queries, 3)
+        data = self.client.get(f"/service_tickets/{self.service_ticket_id}?expand=customer,mechanics,parts.part_description").get_json()
+        self.assertEqual((len(data["mechanics"]), len(data["parts"])), (30, 100))
+
+    def test_read_service_ticket_expanded_cache_invalidated(self):
+        url = f"/service_tickets/{self.service_ticket_id}?expand=customer,parts.part_description"
+        self.assertEqual(self.client.get(url).get_json()["customer"]["first_name"], "FirstTestCustomer")
+        self.client.put("/customers", headers={"Authorization" : f"Bearer {self.customer_token}"},
+                        json={"first_name" : "Renamed", "last_name" : "LastTestCustomer", "email" : "custmer_test@email.com", "phone" : "+1234567890"})
+        self.assertEqual(self.client.get(url).get_json()["customer"]["first_name"], "Renamed")
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/add_part/{self.part_id}")
+        self.client.put("/part_descriptions/1", json={"name" : "Renamed", "price" : 10.0, "made_in" : "TestLand"})
+        self.assertEqual(self.client.get(url).get_json()["parts"][0]["part_description"]["name"], "Renamed")
+
+    def test_service_ticket_totals(self):
+        url = f"/service_tickets/{self.service_ticket_id}/total"
+        self.assertEqual(self.client.get(url).get_json(), {"service_ticket_id" : self.service_ticket_id, "labor" : 100.0, "parts" : 0.0, "parts_count" : 0, "total" : 100.0})
+        # Cached totals follow parts being added and removed, and price changes
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/add_part/{self.part_id}")
+        self.assertEqual(self.client.get(url).get_json()["total"], 110.0)
+        self.client.put("/part_descriptions/1", json={"name" : "TestPartDescription", "price" : 12.5, "made_in" : "TestLand"})
+        self.assertEqual(self.client.get(url).get_json()["parts"], 12.5)
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/remove_part/{self.part_id}")
+        self.assertEqual(self.client.get(url).get_json()["parts_count"], 0)
+        self.assertEqual(self.client.get("/service_tickets/99/total").status_code, 404)
+
+    def test_service_tickets_totals_batch(self):
+        with self.app.app_context():
+            other_ticket_id = db.session.scalar(insert(Service_tickets).returning(Service_tickets.id),
+                                                [{"service_desc" : "Other", "price" : 50.0, "VIN" : "VIN001", "customer_id" : self.customer_id}])
+            db.session.execute(insert(Parts), [{"desc_id" : 1, "serial_number" : f"S{i}", "ticket_id" : other_ticket_id} for i in range(3)])
+            db.session.commit()
+        url = f"/service_tickets/totals?ids={self.service_ticket_id},{other_ticket_id},99"
+        self.assertEqual(self.count_queries(self.client.get, url), 1)
+        data = self.client.get(url).get_json()
+        self.assertEqual([(total["service_ticket_id"], total["total"]) for total in data["totals"]], [(self.service_ticket_id, 100.0), (other_ticket_id, 80.0)])
+        self.assertEqual(data["missing"], [99])
+        self.client.put(f"/service_tickets/{self.service_ticket_id}/add_part/{self.part_id}")
+        self.assertEqual(self.client.get(url).get_json()["totals"][0]["total"], 110.0)
+        self.assertEqual(self.client.get("/service_tickets/totals?ids=a,b").status_code, 400)
+        self.assertEqual(self.client.get("/service_tickets/totals").status_code, 400)
+        # Every ticket of the customer, labor and parts
+        response = self.client.get(f"/customers/{self.customer_id}/total")
+        self.assertEqual(response.get_json(), {"customer_id" : self.customer_id, "tickets_count" : 2, "labor" : 150.0, "parts" : 40.0, "parts_count" : 4, "total" : 190.0})
+        self.assertEqual(self.client.get("/customers/99/total").status_code, 404)